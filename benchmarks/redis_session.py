@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+"""Measure telstate I/O of full sessions through the real Redis backend.
+
+This runs dry-run sessions of fake telescopes with a Redis telstate, which
+is either the fakeredis stand-in (default, needs the fakeredis package) or
+a local Redis server given by --redis. Since the components are fake and
+the clock is warped, what remains is the cost of talking to Redis via
+:class:`katsdptelstate.aio.redis.RedisBackend`. For each array size it
+reports round trips, bytes written and round-trip latency per updater tick
+while the antennas slew and track, e.g.::
+
+    python benchmarks/redis_session.py --ants 4 64 --redis localhost:6379
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from typing import List, Dict, Any, Optional
+
+from kattelmod.config import session_from_config
+
+from run_benchmarks import START_TIME, TARGET, fake_config
+
+
+def measure(n_ants: int, endpoint: str, sim_seconds: float,
+            extra_args: List[str]) -> Dict[str, Any]:
+    """Run a session with `n_ants` fake antennas and measure its telstate traffic."""
+    session = session_from_config(io.StringIO(fake_config(n_ants)), use_cache=False)
+    session.targets = True
+    args = session.argparser().parse_args(
+        ['--dry-run', f'--start-time={START_TIME}', '--log-level=WARNING',
+         f'--telstate={endpoint}', '--trace-telstate', *extra_args, TARGET])
+
+    async def run() -> Dict[str, Any]:
+        async with await session.connect(args):
+            session.ants.target = TARGET
+            session.ants.activity = 'slew'
+            traffic = session.telstate_traffic.copy()
+            ticks = session.updater_stats().ticks
+            start = time.perf_counter()
+            await session.sleep(sim_seconds)
+            wall_time = time.perf_counter() - start
+            ticks = session.updater_stats().ticks - ticks
+            traffic = session.telstate_traffic - traffic
+            return {'ants': n_ants, 'ticks': ticks, 'wall_time': wall_time,
+                    'round_trips_per_tick': traffic.round_trips / ticks,
+                    'bytes_per_tick': traffic.bytes_written / ticks,
+                    'latency_per_tick': traffic.latency_total / ticks,
+                    'latency_max': traffic.latency_max}
+
+    loop = session.make_event_loop(args)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0],
+                                     epilog='Arguments after -- are passed to the session.')
+    parser.add_argument('--ants', type=int, nargs='+', default=[2, 16, 64],
+                        help='Numbers of antennas to try (default: %(default)s)')
+    parser.add_argument('--redis', metavar='HOST:PORT', default='fakeredis',
+                        help='Redis server to use instead of fakeredis')
+    parser.add_argument('--duration', type=float, default=10.0,
+                        help='Simulated seconds to measure (default: %(default)s)')
+    parser.add_argument('--output', help='Also write the results to this JSON file')
+    argv = list(sys.argv[1:] if argv is None else argv)
+    session_args = []    # type: List[str]
+    if '--' in argv:
+        split = argv.index('--')
+        argv, session_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+
+    print(f'{"ants":>5} {"ticks":>6} {"trips/tick":>11} {"bytes/tick":>11} '
+          f'{"latency/tick [ms]":>18} {"max latency [ms]":>17}')
+    results = []
+    for n_ants in args.ants:
+        result = measure(n_ants, args.redis, args.duration, session_args)
+        results.append(result)
+        print('{ants:5d} {ticks:6d} {round_trips_per_tick:11.2f} {bytes_per_tick:11.0f} '
+              '{latency:18.3f} {latency_max:17.3f}'.format(
+                  latency=1000 * result['latency_per_tick'],
+                  **{**result, 'latency_max': 1000 * result['latency_max']}))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'redis': args.redis, 'results': results}, f, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+"""Benchmarks of the session life cycle and sensor update throughput.
+
+All benchmarks use fake components and the in-memory telstate, so they run
+anywhere. They measure
+
+- config parsing and component construction time vs number of antennas,
+  with and without the compiled config cache,
+- wall time per updater tick vs number of antennas,
+- telstate writes per second through :class:`TelstateUpdatingComponent`,
+- the logging overhead of each of these writes at INFO level,
+- simulated seconds per wall-clock second of a dry run of basic_track.py,
+- clock reads per second, compared to a clock that locks on every read.
+
+The results are written to a JSON file. Pass a previous results file via
+--baseline to flag metrics that got worse by more than --tolerance (the
+exit status is then non-zero), e.g.::
+
+    python benchmarks/run_benchmarks.py --output new.json --baseline old.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import io
+import json
+import logging
+import os.path
+import platform
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from typing import List, Dict, Callable, Any, Optional
+
+from katsdptelstate.aio import TelescopeState
+
+import kattelmod
+import kattelmod.test
+from kattelmod.batch import dry_run
+from kattelmod.clock import Clock, WarpEventLoop
+from kattelmod.component import TelstateUpdatingComponent
+from kattelmod.config import CACHE_DIR_ENV, session_from_config
+from kattelmod.systems.mkat.generate_sim_config import MKAT_ANTENNA_ORDER, SKA_ANTENNA_ORDER
+
+
+START_TIME = '2016-02-25 10:14:00'
+TARGET = 'Sun, special'
+# Number of (MeerKAT, SKA) antennas in each benchmarked array
+ARRAYS = {'2': (2, 0), '4': (4, 0), '16': (16, 0), '64': (64, 0),
+          '64+ska': (64, len(SKA_ANTENNA_ORDER))}
+CONFIG_TEMPLATE = """\
+[Telescope mkat]
+ants* = fake.AntennaPositioner
+sub = fake.Subarray
+anc = fake.Environment
+cbf = fake.CorrelatorBeamformer
+sdp = fake.ScienceDataProcessor
+obs = fake.Observation
+
+[ants]
+names = {names}
+"""
+
+
+class Results:
+    """Benchmark metrics, each with a unit and a direction of improvement."""
+
+    def __init__(self) -> None:
+        self.metrics = {}    # type: Dict[str, Dict[str, Any]]
+
+    def add(self, name: str, value: float, unit: str, higher_is_better: bool = False) -> None:
+        self.metrics[name] = {'value': value, 'unit': unit,
+                              'higher_is_better': higher_is_better}
+        print(f'{name:<40} {value:12.6g} {unit}')
+
+
+def fake_config(n_mkat: int, n_ska: int = 0) -> str:
+    """Config of a fake telescope with the given number of antennas."""
+    names = [f'm{ant:03}' for ant in sorted(MKAT_ANTENNA_ORDER[:n_mkat])]
+    names += [f's{ant:04}' for ant in sorted(SKA_ANTENNA_ORDER[:n_ska])]
+    return CONFIG_TEMPLATE.format(names=','.join(names))
+
+
+def best_time(func: Callable[[], Any], repeat: int) -> float:
+    """Minimum wall time of `repeat` calls of `func`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_config(results: Results, repeat: int) -> None:
+    for label, (n_mkat, n_ska) in ARRAYS.items():
+        config = fake_config(n_mkat, n_ska)
+        elapsed = best_time(lambda: session_from_config(io.StringIO(config), use_cache=False),
+                            repeat)
+        results.add(f'config_construct[{label}]', elapsed, 's')
+        # Warm up the cache, then time the hits
+        session_from_config(io.StringIO(config))
+        elapsed = best_time(lambda: session_from_config(io.StringIO(config)), repeat)
+        results.add(f'config_construct_cached[{label}]', elapsed, 's')
+
+
+def bench_updater(results: Results, sim_seconds: float) -> None:
+    for label, (n_mkat, n_ska) in ARRAYS.items():
+        session = session_from_config(io.StringIO(fake_config(n_mkat, n_ska)))
+        session.targets = True
+        args = session.argparser().parse_args(
+            ['--dry-run', f'--start-time={START_TIME}', '--log-level=WARNING', TARGET])
+
+        async def run() -> float:
+            async with await session.connect(args):
+                session.ants.target = TARGET
+                session.ants.activity = 'slew'
+                ticks = session.updater_stats().ticks
+                start = time.perf_counter()
+                await session.sleep(sim_seconds)
+                elapsed = time.perf_counter() - start
+                return elapsed / (session.updater_stats().ticks - ticks)
+
+        loop = session.make_event_loop(args)
+        try:
+            asyncio.set_event_loop(loop)
+            tick_time = loop.run_until_complete(run())
+        finally:
+            loop.close()
+        results.add(f'updater_tick[{label}]', tick_time, 's')
+
+
+def telstate_write_time(n_writes: int) -> float:
+    """Wall time per sensor update sent to telstate by a component."""
+    class Sensors(TelstateUpdatingComponent):
+        def __init__(self) -> None:
+            super().__init__()
+            self._initialise_attributes(locals())
+            self.value = 0.0
+
+    async def run() -> float:
+        comp = Sensors()
+        comp._name = 'bench'
+        comp._telstate = TelescopeState()
+        await comp._start()
+        start = time.perf_counter()
+        for n in range(n_writes):
+            comp._update_time = 1456395240.0 + n
+            comp.value = float(n)
+        await comp._flush()
+        return (time.perf_counter() - start) / n_writes
+
+    loop = WarpEventLoop(Clock(0.0, 1456395240.0))
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(run())
+    finally:
+        loop.close()
+
+
+def bench_telstate_writes(results: Results, n_writes: int) -> None:
+    results.add('telstate_writes', 1.0 / telstate_write_time(n_writes), 'writes/s',
+                higher_is_better=True)
+
+
+def bench_log_overhead(results: Results, n_writes: int) -> None:
+    """Cost of (filtered) debug logging per telstate update at INFO level."""
+    old_level = logging.root.level
+    logging.root.setLevel(logging.INFO)
+    try:
+        # Take the best of a few runs, as the difference is small
+        logging.disable(logging.CRITICAL)
+        without_logging = min(telstate_write_time(n_writes) for _ in range(3))
+        logging.disable(logging.NOTSET)
+        with_logging = min(telstate_write_time(n_writes) for _ in range(3))
+    finally:
+        logging.disable(logging.NOTSET)
+        logging.root.setLevel(old_level)
+    results.add('log_overhead_per_update', max(with_logging - without_logging, 0.0), 's')
+
+
+def bench_dry_run(results: Results, duration: float) -> None:
+    script = os.path.join(os.path.dirname(kattelmod.test.__file__), 'basic_track.py')
+    for label, options in [('', []), ('[fast_forward]', ['--fast-forward'])]:
+        # The captured script log spans the run in simulated time
+        result = dry_run(script, ['-t', str(duration), *options, TARGET], start_time=START_TIME)
+        if not result.success:
+            raise RuntimeError(f'Dry run failed: {result.error}')
+        results.add(f'dry_run_speed{label}', result.sim_duration / result.wall_time,
+                    'sim s/wall s', higher_is_better=True)
+
+
+class LockedClock:
+    """Reference clock that takes a lock on every read, as a baseline."""
+
+    def __init__(self, rate: float, start_time: float) -> None:
+        self._lock = threading.Lock()
+        self._rate = rate
+        self._bias = start_time - time.time() / rate
+
+    def time(self) -> float:
+        with self._lock:
+            return time.time() / self._rate + self._bias
+
+
+def bench_clock_reads(results: Results, number: int) -> None:
+    start_time = 1456395240.0
+    clocks = [('locked', LockedClock(1.0, start_time)), ('lock_free', Clock(1.0, start_time)),
+              ('warp', Clock(0.0, start_time))]
+    for label, clock in clocks:
+        elapsed = min(timeit.repeat(clock.time, number=number, repeat=5))
+        results.add(f'clock_reads[{label}]', number / elapsed, 'reads/s', higher_is_better=True)
+
+
+def compare(metrics: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+            tolerance: float) -> List[str]:
+    """Names of metrics that are more than `tolerance` worse than the baseline."""
+    regressions = []
+    print(f'\n{"metric":<40} {"baseline":>12} {"current":>12} {"change":>8}')
+    for name, metric in metrics.items():
+        if name not in baseline:
+            continue
+        old, new = baseline[name]['value'], metric['value']
+        change = new / old - 1.0 if old else 0.0
+        worse = -change if metric['higher_is_better'] else change
+        flag = '  REGRESSION' if worse > tolerance else ''
+        print(f'{name:<40} {old:12.6g} {new:12.6g} {change:+8.1%}{flag}')
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--output', default='benchmark_results.json',
+                        help='JSON file that receives the results (default: %(default)s)')
+    parser.add_argument('--baseline', help='Earlier results file to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='Relative slowdown flagged as a regression (default: %(default)s)')
+    parser.add_argument('--quick', action='store_true',
+                        help='Shorter runs, for a rough idea')
+    args = parser.parse_args(argv)
+
+    results = Results()
+    # Start from an empty config cache and leave the user's cache alone
+    with tempfile.TemporaryDirectory() as cache:
+        os.environ[CACHE_DIR_ENV] = cache
+        bench_config(results, repeat=1 if args.quick else 5)
+        bench_updater(results, sim_seconds=2.0 if args.quick else 20.0)
+        bench_telstate_writes(results, n_writes=2000 if args.quick else 20000)
+        bench_log_overhead(results, n_writes=2000 if args.quick else 20000)
+        bench_dry_run(results, duration=20.0 if args.quick else 300.0)
+    bench_clock_reads(results, number=20000 if args.quick else 200000)
+
+    report = {'metadata': {'date': datetime.datetime.utcnow().isoformat(),
+                           'python': platform.python_version(),
+                           'platform': platform.platform(),
+                           'kattelmod': kattelmod.__version__,
+                           'quick': args.quick},
+              'metrics': results.metrics}
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['metrics']
+        regressions = compare(results.metrics, baseline, args.tolerance)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s): {", ".join(regressions)}')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,173 @@
+"""Run many dry runs of an observation script in parallel.
+
+Observation scripts are validated by dry-running them for a range of start
+times and telescope configurations. This runs each combination as a normal
+dry run of the script (via :func:`runpy.run_path`, so that the script goes
+through :func:`session_from_commandline` and :meth:`CaptureSession.run` as
+usual) in a pool of worker processes, and collects the outcomes into a
+single report. Each run gets its own :class:`~kattelmod.clock.WarpEventLoop`
+inside the worker process that runs it.
+
+Run it as ``python -m kattelmod.batch script.py --start-time T1 T2 ...``.
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import multiprocessing
+import runpy
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence, Iterable, NamedTuple, Optional
+
+
+class DryRunResult(NamedTuple):
+    """Outcome of a single dry run of an observation script."""
+
+    script: str
+    start_time: Optional[str]
+    config: Optional[str]
+    args: List[str]
+    success: bool
+    error: str
+    sim_duration: float
+    wall_time: float
+    script_log: List[str]
+
+
+class _LogCapture(logging.Handler):
+    """Logging handler that keeps formatted records and their (simulated) times."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.lines = []      # type: List[str]
+        self.times = []      # type: List[float]
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.lines.append(self.format(record))
+            self.times.append(record.created)
+        except Exception:
+            self.handleError(record)
+
+
+def dry_run(script: str, args: Sequence[str] = (), start_time: str = None,
+            config: str = None) -> DryRunResult:
+    """Dry-run observation `script` in the current process.
+
+    Parameters
+    ----------
+    script
+        Path of observation script
+    args
+        Extra command-line arguments for the script (--dry-run is added)
+    start_time
+        Value of --start-time, if given
+    config
+        Value of --config, if given
+
+    Returns
+    -------
+    result
+        Outcome of the run, where the simulated duration is the span of the
+        script log (whose records are timestamped by the session clock)
+    """
+    argv = [script, '--dry-run', *args]
+    if start_time is not None:
+        argv.append(f'--start-time={start_time}')
+    if config is not None:
+        argv.append(f'--config={config}')
+    capture = _LogCapture()
+    # Having a root handler also stops configure_logging from adding a stream handler
+    logging.root.addHandler(capture)
+    old_argv = sys.argv
+    sys.argv = argv
+    error = ''
+    start = time.perf_counter()
+    try:
+        runpy.run_path(script, run_name='__main__')
+    except SystemExit as exc:
+        if exc.code not in (None, 0):
+            error = f'SystemExit: {exc.code}'
+    except Exception:
+        error = ''.join(traceback.format_exception_only(*sys.exc_info()[:2])).strip()
+    finally:
+        wall_time = time.perf_counter() - start
+        sys.argv = old_argv
+        logging.root.removeHandler(capture)
+    sim_duration = capture.times[-1] - capture.times[0] if capture.times else 0.0
+    return DryRunResult(script, start_time, config, argv[1:], not error, error,
+                        sim_duration, wall_time, capture.lines)
+
+
+def _dry_run(run_args) -> DryRunResult:
+    return dry_run(*run_args)
+
+
+def run_batch(script: str, start_times: Iterable[Optional[str]] = (None,),
+              configs: Iterable[Optional[str]] = (None,), args: Sequence[str] = (),
+              jobs: int = None) -> List[DryRunResult]:
+    """Dry-run `script` for every combination of start time and config.
+
+    The runs are spread over `jobs` worker processes (default is one per
+    CPU). Workers are spawned rather than forked, so that runs do not inherit
+    the state of the caller. On Python 3.11 and later each worker also does
+    a single run before it is replaced, so that every run starts from a clean
+    interpreter (older versions reuse workers, which carries module-level
+    state like caches over from one run to the next).
+    Results are returned in the order of the combinations.
+    """
+    matrix = [(script, list(args), start_time, config)
+              for config, start_time in itertools.product(configs, start_times)]
+    context = multiprocessing.get_context('spawn')
+    options = {'max_tasks_per_child': 1} if sys.version_info >= (3, 11) else {}
+    with ProcessPoolExecutor(max_workers=jobs, mp_context=context, **options) as pool:
+        return list(pool.map(_dry_run, matrix))
+
+
+def summary(results: Sequence[DryRunResult]) -> str:
+    """Tabulate the outcomes of dry runs as text."""
+    lines = ['{:<24} {:<24} {:<7} {:>12} {:>9}'.format(
+        'start time', 'config', 'result', 'sim time [s]', 'wall [s]')]
+    for result in results:
+        lines.append('{:<24} {:<24} {:<7} {:12.1f} {:9.2f}'.format(
+            result.start_time or '-', result.config or '-',
+            'ok' if result.success else 'FAILED', result.sim_duration, result.wall_time))
+        if not result.success:
+            lines.append(f'    {result.error}')
+    n_failed = sum(not result.success for result in results)
+    lines.append(f'{len(results)} runs, {n_failed} failed')
+    return '\n'.join(lines)
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(
+        description='Dry-run an observation script for many start times and configs.',
+        epilog='Arguments after -- are passed on to the script itself.')
+    parser.add_argument('script', help='Observation script to run')
+    parser.add_argument('--start-time', nargs='+', default=[None], dest='start_times',
+                        help='Start times of the dry runs')
+    parser.add_argument('--config', nargs='+', default=[None], dest='configs',
+                        help='Telescope config files of the dry runs')
+    parser.add_argument('-j', '--jobs', type=int,
+                        help='Number of worker processes (default: one per CPU)')
+    parser.add_argument('--report', help='Write the full results as JSON to this file')
+    argv = list(sys.argv[1:] if argv is None else argv)
+    script_args = []     # type: List[str]
+    if '--' in argv:
+        split = argv.index('--')
+        argv, script_args = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    results = run_batch(args.script, args.start_times, args.configs, script_args, args.jobs)
+    print(summary(results))
+    if args.report:
+        with open(args.report, 'w') as report:
+            json.dump([result._asdict() for result in results], report, indent=2)
+    return 0 if all(result.success for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
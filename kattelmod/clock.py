@@ -4,7 +4,7 @@ import time
 import threading
 import socket
 from selectors import DefaultSelector, BaseSelector, SelectorKey
-from typing import Union, List, Tuple, Mapping, Any, Optional
+from typing import Union, List, Tuple, Mapping, NamedTuple, Any, Optional
 
 import async_timeout
 
@@ -12,6 +12,13 @@ import async_timeout
 _FileObject = Union[int, socket.socket]
 
 
+class _ClockState(NamedTuple):
+    """Snapshot of the clock parameters, which is replaced as a whole."""
+    rate: float
+    bias: float
+    monotonic_bias: float
+
+
 class Clock:
     """Clock that doesn't necessarily track wall clock time.
 
@@ -20,7 +27,11 @@ class Clock:
     jumped).
 
     It is thread-safe because the current time may be accessed by the logging
-    system from other threads.
+    system from other threads. Since the clock is read far more often than it
+    is changed (on every sensor update, log record and event loop iteration),
+    its parameters are kept in an immutable snapshot that is swapped out in a
+    single assignment on changes. Reads therefore need no lock, while changes
+    are serialised by a lock to avoid losing concurrent updates.
 
     Parameters
     ----------
@@ -42,24 +53,37 @@ class Clock:
         if start_time is None:
             start_time = now
         self._lock = threading.Lock()
-        self._rate = rate
-        # Ensure now / self._rate + self._bias == start_time
-        self._bias = start_time - now / self._rate
+        # Ensure now / rate + bias == start_time
+        self._state = _ClockState(rate, start_time - now / rate, 0.0)
 
     def time(self) -> float:
         """Get current time in seconds since UNIX epoch"""
-        with self._lock:
-            return time.time() / self._rate + self._bias
+        state = self._state
+        return time.time() / state.rate + state.bias
 
     def monotonic(self) -> float:
         """Equivalent to time.monotonic() for this clock"""
-        with self._lock:
-            return time.monotonic() / self._rate
+        state = self._state
+        return time.monotonic() / state.rate + state.monotonic_bias
 
     @property
     def rate(self) -> float:
         """Seconds of real time that pass per simulated second"""
-        return self._rate
+        return self._state.rate
+
+    def set_rate(self, rate: float) -> None:
+        """Change the rate of the clock without a jump in its time.
+
+        The new rate may not be zero, since that needs a different kind of clock.
+        """
+        if rate == 0.0:
+            raise ValueError('Cannot change to a rate of zero')
+        with self._lock:
+            old = self._state
+            now, now_monotonic = time.time(), time.monotonic()
+            self._state = _ClockState(
+                rate, now / old.rate + old.bias - now / rate,
+                now_monotonic / old.rate + old.monotonic_bias - now_monotonic / rate)
 
     def advance(self, delta: float) -> None:
         """Instantly increase the return value of :meth:`time` by `delta`.
@@ -73,7 +97,9 @@ class _WarpClock(Clock):
     """Implementation of :class:`Clock` for zero rate.
 
     It is made into a separate class because most of the implementation
-    details are somewhat different.
+    details are somewhat different. The only state that changes is the
+    amount by which the clock has been advanced, which is a float that is
+    replaced in a single assignment.
     """
     def __init__(self, rate: float = 0.0, start_time: float = None) -> None:
         if start_time is None:
@@ -84,19 +110,20 @@ class _WarpClock(Clock):
 
     def time(self) -> float:
         """Get current time in seconds since UNIX epoch"""
-        with self._lock:
-            return self._start_time + self._advanced
+        return self._start_time + self._advanced
 
     def monotonic(self) -> float:
         """Equivalent to time.monotonic() for this clock"""
-        with self._lock:
-            return self._advanced
+        return self._advanced
 
     @property
     def rate(self) -> float:
         """Seconds of real time that pass per simulated second"""
         return 0.0
 
+    def set_rate(self, rate: float) -> None:
+        raise TypeError('Cannot change rate of a clock with zero rate')
+
     def advance(self, delta: float) -> None:
         """Instantly increase the return value of :meth:`time` by `delta`."""
         with self._lock:
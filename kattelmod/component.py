@@ -1,10 +1,12 @@
-from collections import deque
 import logging
 from importlib import import_module
 import inspect
+from fnmatch import fnmatchcase
 import asyncio
-from typing import (List, Dict, Mapping, MutableMapping, Sequence, Iterable, Iterator,
-                    Awaitable, Callable, Optional, Any, Union)
+import contextlib
+import time
+from typing import (List, Tuple, Dict, Mapping, MutableMapping, Sequence, Iterable, Iterator,
+                    Awaitable, Callable, ContextManager, Optional, Any, Union)
 
 import aiokatcp
 from katpoint import Antenna, Target
@@ -12,6 +14,9 @@ from katpoint import Antenna, Target
 from katsdptelstate.endpoint import endpoint_parser
 
 from .clock import get_clock, real_timeout
+from .pool import katcp_pool
+from .registry import get_antenna, get_target
+from .telstate import TelstateWriter, same_value
 
 
 logger = logging.getLogger(__name__)
@@ -21,13 +26,55 @@ logger = logging.getLogger(__name__)
 SENSOR_MIN_PERIOD = 0.4
 
 
+# Cache of (sensor names, method names) found on each component class
+_CLASS_ATTRIBUTES = {}    # type: Dict[type, Tuple[List[str], List[str]]]
+
+
+# Callback invoked as callback(component, sensor_name, new_value)
+SensorWatcher = Callable[['TelstateUpdatingComponent', str, Any], None]
+
+
 class ComponentNotReadyError(RuntimeError):
     """Component not ready to perform requested action."""
 
 
-def is_rate_limited(sensor_name: str) -> bool:
-    """Test whether sensor will have rate-limited updates."""
-    return sensor_name.startswith('pos_')
+class RatePolicy:
+    """Policy that determines which updates of a sensor are sent to telstate.
+
+    Parameters
+    ----------
+    period : float, optional
+        Minimum time between updates, in seconds (0 means no limit). Updates
+        are only sent on the first updater tick of each period, so that all
+        sensors sharing a period are sent together.
+    deadband : float, optional
+        Only send numeric sensor values that differ by more than this from
+        the last value sent (0 means no deadband)
+    event : bool, optional
+        Only send the sensor value when it changes (event-only sensor)
+    """
+
+    def __init__(self, period: float = 0.0, deadband: float = 0.0,
+                 event: bool = False) -> None:
+        self.period = period
+        self.deadband = deadband
+        self.event = event
+
+    def __repr__(self) -> str:
+        return (f'RatePolicy(period={self.period!r}, deadband={self.deadband!r}, '
+                f'event={self.event!r})')
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, RatePolicy) and \
+            (self.period, self.deadband, self.event) == \
+            (other.period, other.deadband, other.event)
+
+    def allows(self, value: Any, last_value: Any) -> bool:
+        """True if `value` differs enough from `last_value` to be sent."""
+        if self.deadband > 0.0 and isinstance(value, (int, float)) \
+                and isinstance(last_value, (int, float)):
+            return abs(value - last_value) > self.deadband
+        return not (self.event and same_value(value, last_value))
 
 
 def _sensor_transform(sensor_value: Any) -> Any:
@@ -40,7 +87,14 @@ def _sensor_transform(sensor_value: Any) -> Any:
 
 
 class Component:
-    """Basic element of telescope system that provides monitoring and control."""
+    """Basic element of telescope system that provides monitoring and control.
+
+    Components are started concurrently by :func:`start_components`, and
+    `_start_after` names the components that need to be started first.
+    """
+
+    _start_after = ()  # type: Sequence[str]
+
     def __init__(self) -> None:
         self._name = ''
         self._immutables = []    # type: List[str]
@@ -64,10 +118,48 @@ class Component:
         """True if component is fake."""
         return self._updatable and self.__class__.__module__.endswith('.fake')
 
+    @classmethod
+    def _class_attributes(cls) -> Tuple[List[str], List[str]]:
+        """Names of sensors (e.g. properties) and methods defined on the class.
+
+        This is cached per class, since class attributes only change when
+        :meth:`_add_dummy_methods` adds new ones.
+        """
+        try:
+            return _CLASS_ATTRIBUTES[cls]
+        except KeyError:
+            sensors, methods = [], []    # type: List[str], List[str]
+            for name in dir(cls):
+                if callable(getattr(cls, name)):
+                    if not name.endswith('__'):
+                        methods.append(name)
+                elif not name.startswith('_'):
+                    sensors.append(name)
+            _CLASS_ATTRIBUTES[cls] = sensors, methods
+            return sensors, methods
+
     @property
     def _sensors(self) -> List[str]:
-        return [name for name in sorted(dir(self))
-                if not name.startswith('_') and not callable(getattr(self, name))]
+        # The cache is keyed on the class attributes and the names of the
+        # attributes of the object, so that it is refreshed whenever either
+        # change. Its own slot is reserved up front so that storing the
+        # cache does not change the names.
+        cache = self.__dict__.setdefault('_sensors_cache', None)
+        class_attributes = type(self)._class_attributes()
+        names = tuple(self.__dict__)
+        if cache is None or cache[0] is not class_attributes or cache[1] != names:
+            sensors = sorted(set(class_attributes[0]).union(
+                name for name, value in self.__dict__.items()
+                if not name.startswith('_') and not callable(value)))
+            cache = self.__dict__['_sensors_cache'] = (class_attributes, names, sensors)
+        return list(cache[2])
+
+    def _api_methods(self) -> Dict[str, Callable]:
+        """Public and private methods of object, excluding special methods."""
+        methods = {name: getattr(self, name) for name in type(self)._class_attributes()[1]}
+        methods.update((name, value) for name, value in self.__dict__.items()
+                       if callable(value) and not name.endswith('__'))
+        return methods
 
     def _initialise_attributes(self, params: MutableMapping[str, Any]) -> None:
         """Assign parameters in dict *params* to attributes."""
@@ -83,7 +175,11 @@ class Component:
             pass
 
         for name in names.split(' '):
-            setattr(cls, name.strip(), func if func else dummy_coro)
+            name = name.strip()
+            if name not in cls.__dict__:
+                # Adding a new attribute invalidates the cached class attributes
+                _CLASS_ATTRIBUTES.clear()
+            setattr(cls, name, func if func else dummy_coro)
 
     async def _start(self) -> None:
         self._started = True
@@ -106,58 +202,142 @@ class Component:
 class TelstateUpdatingComponent(Component):
     """Component that will update telstate when its attributes are set.
 
-    The updates to telstate are scheduled as asyncio tasks. Use
-    :meth:`_flush` to ensure that they have been successfully sent to
-    telstate.
+    The updates to telstate are queued on a :class:`TelstateWriter`, which
+    sends them in batches from asyncio tasks. Each component starts off with
+    its own writer, but a capture session typically replaces it with a
+    single writer shared by all its components. Use :meth:`_flush` to ensure
+    that the updates have been successfully sent to telstate.
+
+    Sensor updates are sent on every assignment by default. The class-level
+    `_rate_policies` maps sensor names or glob patterns to a
+    :class:`RatePolicy` that limits this, and individual components can
+    override them via :meth:`_set_rate_policies` (e.g. from the config file).
+    Immutable sensors are never rate-limited.
+
+    The updater calls :meth:`_update` every `_update_period` seconds, or at
+    its default rate if this is None.
+
+    Callbacks registered with :meth:`_watch` are called whenever the value of
+    a sensor changes, which allows conditions to be evaluated on demand
+    instead of polling the sensors.
     """
 
+    _update_period = None  # type: Optional[float]
+    _rate_policies = {'pos_*': RatePolicy(period=SENSOR_MIN_PERIOD)}  # type: Dict[str, RatePolicy]
+
     def __init__(self) -> None:
         self._telstate = None
-        self._update_queue = deque()
+        self._writer = TelstateWriter()
         self._update_time = 0.0
         self._elapsed_time = 0.0
         self._last_update = 0.0
-        self._last_rate_limited_send = 0.0
+        # Start of current rate-limiting window per period
+        self._rate_windows = {}      # type: Dict[float, float]
+        self._sensor_policies = {}   # type: Dict[str, Optional[RatePolicy]]
+        self._last_sent_values = {}  # type: Dict[str, Any]
+        self._watchers = {}          # type: Dict[str, List[SensorWatcher]]
         super().__init__()
 
+    def _watch(self, attr_name: str, callback: SensorWatcher) -> None:
+        """Call `callback(component, attr_name, value)` when sensor changes."""
+        self._watchers.setdefault(attr_name, []).append(callback)
+
+    def _unwatch(self, attr_name: str, callback: SensorWatcher) -> None:
+        """Stop calling `callback` when sensor changes (if it was watching)."""
+        callbacks = self._watchers.get(attr_name, [])
+        if callback in callbacks:
+            callbacks.remove(callback)
+        if not callbacks:
+            self._watchers.pop(attr_name, None)
+
+    def _set_rate_policies(self, policies: Mapping[str, RatePolicy]) -> None:
+        """Override class-level rate policies with `policies` for this component."""
+        self._rate_policies = {**self._rate_policies, **policies}
+        self._sensor_policies = {}
+
+    def _rate_policy(self, attr_name: str) -> Optional[RatePolicy]:
+        """Look up rate policy of sensor `attr_name` (None if not limited)."""
+        try:
+            return self._sensor_policies[attr_name]
+        except KeyError:
+            pass
+        policy = None
+        if attr_name not in self._immutables:
+            # Exact names take precedence, then later (more specific) patterns
+            policy = self._rate_policies.get(attr_name)
+            if policy is None:
+                for pattern, pattern_policy in reversed(list(self._rate_policies.items())):
+                    if fnmatchcase(attr_name, pattern):
+                        policy = pattern_policy
+                        break
+        self._sensor_policies[attr_name] = policy
+        return policy
+
+    def _time_to_send(self, attr_name: str, value: Any) -> bool:
+        """Check whether sensor update is allowed by its rate policy."""
+        policy = self._rate_policy(attr_name)
+        if policy is None:
+            return True
+        # A period seen for the first time (e.g. after a restart) starts its window now
+        if policy.period > 0.0 and \
+                self._rate_windows.setdefault(policy.period, self._last_update) \
+                != self._last_update:
+            return False
+        if policy.deadband > 0.0 or policy.event:
+            if attr_name in self._last_sent_values and \
+                    not policy.allows(value, self._last_sent_values[attr_name]):
+                return False
+            self._last_sent_values[attr_name] = value
+        return True
+
     def __setattr__(self, attr_name: str, value: Any) -> None:
-        super().__setattr__(attr_name, value)
-        # Do sensor updates (either event or event-rate SENSOR_MIN_PERIOD)
-        time_to_send = not is_rate_limited(attr_name) or \
-            self._last_rate_limited_send == self._last_update
-        if not attr_name.startswith('_') and self._telstate and time_to_send:
+        watchers = self.__dict__.get('_watchers')
+        if watchers and attr_name in watchers:
+            changed = not same_value(value, getattr(self, attr_name, None))
+            super().__setattr__(attr_name, value)
+            if changed:
+                for callback in list(watchers[attr_name]):
+                    callback(self, attr_name, value)
+        else:
+            super().__setattr__(attr_name, value)
+        if attr_name.startswith('_') or not self._telstate:
+            return
+        # Do sensor updates (either event or according to rate policy)
+        sensor_value = _sensor_transform(value)
+        if self._time_to_send(attr_name, sensor_value):
             sensor_name = f"{self._name}_{attr_name}"
             # Use fixed update time while within an update() call
             ts = self._update_time if self._update_time else get_clock().time()
             # If this is initial sensor update, move it into recent past to
             # avoid race conditions in e.g. CBF simulator that reads it
-            if not self._last_update:
+            initial = not self._last_update
+            if initial:
                 ts -= 300.0
-            logger.debug("telstate {} {} {}"
-                         .format(ts, sensor_name, _sensor_transform(value)))
-            update_task = asyncio.get_event_loop().create_task(
-                self._telstate.add(sensor_name, _sensor_transform(value),
-                                   ts=ts, immutable=attr_name in self._immutables)
-            )
-            self._update_queue.append(update_task)
+            logger.debug("telstate %s %s %s", ts, sensor_name, sensor_value)
+            self._writer.add(self._telstate,
+                             (sensor_name, sensor_value, ts, attr_name in self._immutables),
+                             initial)
 
     def _update(self, timestamp: float) -> None:
         self._elapsed_time = timestamp - self._last_update \
             if self._last_update else 0.0
         self._last_update = timestamp
-        if timestamp - self._last_rate_limited_send > SENSOR_MIN_PERIOD:
-            self._last_rate_limited_send = timestamp
+        for period, window_start in self._rate_windows.items():
+            if timestamp - window_start > period:
+                self._rate_windows[period] = timestamp
 
     async def _flush(self) -> None:
         """Wait for asynchronous telstate updates to complete."""
-        while self._update_queue:
-            update_task = self._update_queue.popleft()
-            await update_task
+        await self._writer.flush()
 
     async def _start(self) -> None:
         if self._started:
             return
         await super()._start()
+        # The telstate may be new, so do not rely on what was sent to the last one
+        self._writer.forget_sent()
+        self._rate_windows.clear()
+        self._last_sent_values.clear()
         # Reassign values to object attributes to trigger output to telstate
         for name in self._sensors:
             setattr(self, name, getattr(self, name))
@@ -165,10 +345,18 @@ class TelstateUpdatingComponent(Component):
 
 
 class KATCPComponent(Component):
-    """Component based around a KATCP client connected to an external service."""
-    def __init__(self, endpoint: str) -> None:
+    """Component based around a KATCP client connected to an external service.
+
+    The client is borrowed from the process-wide :func:`katcp_pool` when the
+    component starts and returned to it when the component stops, so that
+    later sessions can reuse the connection. Set `pooled` to False for
+    services that only live as long as the component, to close the
+    connection when the component stops instead.
+    """
+    def __init__(self, endpoint: str, pooled: bool = True) -> None:
         super().__init__()
         self._client = None    # type: Optional[aiokatcp.Client]
+        self._pooled = pooled
         self._endpoint = endpoint_parser(-1)(endpoint)
         if self._endpoint.port < 0:
             raise ValueError("Please specify port for KATCP client '{}'"
@@ -180,7 +368,8 @@ class KATCPComponent(Component):
         await super()._start()
         try:
             async with real_timeout(5):
-                self._client = await aiokatcp.Client.connect(self._endpoint.host, self._endpoint.port)
+                self._client = await katcp_pool().acquire(self._endpoint.host,
+                                                          self._endpoint.port)
         except asyncio.TimeoutError:
             raise asyncio.TimeoutError("Timed out trying to connect '{}' to client '{}'"
                                        .format(self._name, self._endpoint)) from None
@@ -189,8 +378,8 @@ class KATCPComponent(Component):
         if not self._started:
             return
         if self._client:
-            self._client.close()
-            await self._client.wait_closed()
+            await katcp_pool().release(self._client, reuse=self._pooled)
+            self._client = None
         await super()._stop()
 
 
@@ -207,6 +396,17 @@ class MultiMethod:
         Name of method to call on objects
     description : string
         Docstring of method, added to :class:`MultiMethod` object
+    methods : sequence of callables, optional
+        Methods already bound to `objects` (looked up by `name` by default)
+    max_in_flight : int, optional
+        Maximum number of member awaitables that run concurrently (no limit
+        by default)
+    timeout : float, optional
+        Deadline for each member awaitable, in real time (see
+        :func:`~kattelmod.clock.real_timeout`)
+    partial : bool, optional
+        If true, a failed or timed-out member does not fail the whole call.
+        Its exception is logged and takes its place in the list of results.
 
     Notes
     -----
@@ -214,50 +414,122 @@ class MultiMethod:
     On the other hand, the :class:`MultiComponent` object ensures that
     all objects do have the method before it constructs this object.
 
+    The methods are bound once at construction time. The wall-clock time
+    taken by each member on the last call (until its awaitable completed,
+    if any) is available in the `latencies` dict, keyed by component name
+    (or by position for objects without a name), to spot slow members.
+
     """
-    def __init__(self, objects: Sequence[object], name: str, description: str) -> None:
+    def __init__(self, objects: Sequence[object], name: str, description: str,
+                 methods: Sequence[Optional[Callable]] = None,
+                 max_in_flight: Optional[int] = None, timeout: Optional[float] = None,
+                 partial: bool = False) -> None:
         self.objects = objects
         self.name = name
         self.__doc__ = description
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.partial = partial
+        if methods is None:
+            methods = [getattr(obj, name, None) for obj in objects]
+        self._members = [(getattr(obj, '_name', '') or str(n), method)
+                         for n, (obj, method) in enumerate(zip(objects, methods))
+                         if method]
+        self.latencies = {}  # type: Dict[str, float]
 
     def __call__(self, *args: Any, **kwargs: Any) -> Optional[Awaitable]:
         awaitables = []      # type: List[Awaitable]
-        for obj in self.objects:
-            method = getattr(obj, self.name, None)
-            if method:
-                result = method(*args, **kwargs)
-                if inspect.isawaitable(result):
-                    awaitables.append(result)
+        semaphore = asyncio.Semaphore(self.max_in_flight) if self.max_in_flight else None
+        for member, method in self._members:
+            start = time.perf_counter()
+            result = method(*args, **kwargs)
+            if inspect.isawaitable(result):
+                awaitables.append(self._timed(member, start, result, semaphore))
+            else:
+                self.latencies[member] = time.perf_counter() - start
         if awaitables:
-            return asyncio.gather(*awaitables)
+            return asyncio.gather(*awaitables, return_exceptions=self.partial)
         else:
             return None
 
+    async def _timed(self, member: str, start: float, awaitable: Awaitable,
+                     semaphore: Optional[asyncio.Semaphore]) -> Any:
+        try:
+            if semaphore is not None:
+                async with semaphore:
+                    return await self._await(member, awaitable)
+            else:
+                return await self._await(member, awaitable)
+        finally:
+            self.latencies[member] = time.perf_counter() - start
+
+    async def _await(self, member: str, awaitable: Awaitable) -> Any:
+        try:
+            try:
+                async with real_timeout(self.timeout):
+                    return await awaitable
+            except asyncio.TimeoutError:
+                raise asyncio.TimeoutError(f"Timed out waiting for {member}.{self.name}") from None
+        except Exception as exc:
+            if self.partial:
+                logger.warning('%s.%s failed: %r', member, self.name, exc)
+            raise
+
+    def slowest(self) -> Optional[Tuple[str, float]]:
+        """Name and latency of the slowest member on the last call, if any."""
+        if not self.latencies:
+            return None
+        return max(self.latencies.items(), key=lambda item: item[1])
+
 
 class MultiComponent(Component):
-    """Combine multiple similar components into a single component."""
-    _not_shared = ('_name', '_immutables', '_started', '_comps', '_fake')
+    """Combine multiple similar components into a single component.
+
+    If all the components are of the same type and that type names a
+    `_group_engine` class, an instance of it is constructed from the list of
+    components and stored as `_engine`. This allows e.g. a group of fake
+    antenna positioners to be moved together in a single vectorised pass.
+    An engine may also provide a `set_values(attr_name, values)` method,
+    which receives the whole sequence of values of every bulk attribute
+    assignment (see :meth:`_set_values`) once the components have theirs,
+    so that it can update its own arrays in one go.
+
+    The `max_in_flight`, `timeout` and `partial` parameters are passed on to
+    the :class:`MultiMethod` of each public method to bound the fan-out of
+    requests. They do not apply to private methods like `_start`, `_stop`
+    and `_flush`, whose failures always propagate.
+    """
+    _not_shared = ('_name', '_immutables', '_started', '_comps', '_fake',
+                   '_engine', '_group_engine', '_class_attributes', '_api_methods',
+                   '_set_values')
 
-    def __init__(self, name: str, comps: Iterable[Component]) -> None:
+    def __init__(self, name: str, comps: Iterable[Component],
+                 max_in_flight: Optional[int] = None, timeout: Optional[float] = None,
+                 partial: bool = False) -> None:
         super().__init__()
         self._name = name
         self._comps = list(comps)
         # Create corresponding attributes to access components
         for comp in comps:
             super().__setattr__(comp._name, comp)
+        comp_types = {type(comp) for comp in self._comps}
+        engine = getattr(comp_types.pop(), '_group_engine', None) \
+            if len(comp_types) == 1 else None
+        self._engine = engine(self._comps) if engine else None
 
-        def api_methods(obj: object) -> Dict[str, Any]:
-            return {k: getattr(obj, k) for k in dir(obj)
-                    if callable(getattr(obj, k)) and not k.endswith('__')}
         # Register methods
         methods = {}      # type: Dict[str, Any]
         for comp in self._comps:
-            for name, method in api_methods(comp).items():
+            for name, method in Component._api_methods(comp).items():
                 methods[name] = methods.get(name, []) + [method]
         for name, meths in methods.items():
             # Only create a top-level method if all components below have it
             if len(meths) == len(self._comps) and name not in self._not_shared:
-                multimethod = MultiMethod(self._comps, name, meths[0].__doc__)
+                if name.startswith('_'):
+                    multimethod = MultiMethod(self._comps, name, meths[0].__doc__, meths)
+                else:
+                    multimethod = MultiMethod(self._comps, name, meths[0].__doc__, meths,
+                                              max_in_flight, timeout, partial)
                 super().__setattr__(name, multimethod)
 
     def __setattr__(self, attr_name: str, value: Any) -> None:
@@ -265,8 +537,26 @@ class MultiComponent(Component):
             super().__setattr__(attr_name, value)
         else:
             # Set attribute on underlying components but not on self
-            for comp in self._comps:
-                setattr(comp, attr_name, value)
+            self._set_values(attr_name, [value] * len(self._comps))
+
+    def _set_values(self, attr_name: str, values: Sequence[Any]) -> None:
+        """Set attribute on each component to the corresponding value in `values`.
+
+        The group engine (if it supports it) then gets all the values in one go.
+        """
+        if len(values) != len(self._comps):
+            raise ValueError('Expected {} values for {!r} but got {}'
+                             .format(len(self._comps), attr_name, len(values)))
+        for comp, value in zip(self._comps, values):
+            setattr(comp, attr_name, value)
+        set_values = getattr(self._engine, 'set_values', None)
+        if set_values:
+            set_values(attr_name, values)
+
+    @property
+    def _start_after(self) -> List[str]:
+        """Components that need to start before any of the components in the group."""
+        return sorted({name for comp in self._comps for name in comp._start_after})
 
     def __repr__(self) -> str:
         if len(self._comps) > 0:
@@ -309,7 +599,12 @@ class MultiComponent(Component):
 
 
 class TargetObserverMixin:
-    """Add Target and Observer properties to any component."""
+    """Add Target and Observer properties to any component.
+
+    The observer may be assigned as a description string, which is only
+    turned into a (shared) :class:`katpoint.Antenna` when it is first used.
+    Targets are copies of the targets parsed by the shared target cache.
+    """
     def __init__(self) -> None:
         # NB to call super() here - see "The Sadness of Python's super()"
         super().__init__()
@@ -317,19 +612,82 @@ class TargetObserverMixin:
 
     @property
     def observer(self) -> Union[str, Antenna]:
+        if isinstance(self._observer, str) and self._observer:
+            self._observer = get_antenna(self._observer)
         return self._observer
     @observer.setter  # noqa: E301
     def observer(self, observer: Union[str, Antenna]) -> None:
-        self._observer = Antenna(observer) if observer else ''
+        self._observer = observer if observer else ''
         if self._target:
-            self._target.antenna = self._observer
+            # Rebind a copy, since the caller may still hold the old target
+            self._target = get_target(self._target, self.observer)
 
     @property
     def target(self) -> Union[str, Target]:
         return self._target
     @target.setter  # noqa: E301
     def target(self, target: Union[str, Target]) -> None:
-        self._target = Target(target, antenna=self._observer) if target else ''
+        self._target = get_target(target, self.observer) if target else ''
+
+
+def _dependency_order(depends: Mapping[str, Sequence[str]]) -> List[str]:
+    """Order names so that each comes after the names it `depends` on."""
+    order = []     # type: List[str]
+    remaining = dict(depends)
+    while remaining:
+        ready = [name for name, deps in remaining.items()
+                 if all(dep not in remaining for dep in deps)]
+        if not ready:
+            raise ValueError('Components have cyclic start-up dependencies: {}'
+                             .format(', '.join(sorted(remaining))))
+        for name in ready:
+            del remaining[name]
+        order += ready
+    return order
+
+
+async def start_components(components: Iterable[Component],
+                           phase: Callable[[str], ContextManager] = None) -> None:
+    """Start `components` concurrently, respecting their start-up dependencies.
+
+    Each component starts as soon as all the components named in its
+    `_start_after` have started (names not found in `components` are
+    ignored). If a component fails to start, the start-up of the others is
+    cancelled and the exception is raised.
+
+    Parameters
+    ----------
+    components
+        Components to start
+    phase
+        Context manager factory that wraps the start of each component,
+        called with a phase name like 'start ants' (e.g. for profiling)
+
+    Raises
+    ------
+    ValueError
+        If the start-up dependencies contain a cycle
+    """
+    comps = {comp._name: comp for comp in components}
+    depends = {name: [dep for dep in comp._start_after if dep in comps and dep != name]
+               for name, comp in comps.items()}
+    order = _dependency_order(depends)
+
+    async def start(name: str) -> None:
+        await asyncio.gather(*(tasks[dep] for dep in depends[name]))
+        with phase(f'start {name}') if phase else contextlib.nullcontext():
+            await comps[name]._start()
+
+    tasks = {}     # type: Dict[str, asyncio.Future]
+    for name in order:
+        tasks[name] = asyncio.ensure_future(start(name))
+    try:
+        await asyncio.gather(*tasks.values())
+    except BaseException:
+        for task in tasks.values():
+            task.cancel()
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+        raise
 
 
 def construct_component(comp_type: str, comp_name: str = None, params: Mapping[str, Any] = None) -> Component:
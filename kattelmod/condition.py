@@ -0,0 +1,85 @@
+"""Conditions on component sensors that are maintained as the sensors change."""
+
+import abc
+from typing import Dict, Iterable, Any
+
+from .component import TelstateUpdatingComponent
+from .telstate import same_value
+
+
+class SensorTally(abc.ABC):
+    """Count of components whose sensor currently has a specific value.
+
+    The count is kept up to date incrementally via sensor watchers, so that
+    checking it is cheap regardless of the number of components. The tally
+    is also a condition that can be passed to :meth:`CaptureSession.sleep`:
+    calling it evaluates the predicate (see subclasses) and its `depends`
+    attribute lists the sensors that the predicate depends on, so that it is
+    only re-evaluated after one of them changed.
+
+    Call :meth:`close` (or use the tally as a context manager) to stop
+    watching the sensors.
+
+    Parameters
+    ----------
+    components
+        Components to watch (a :class:`MultiComponent` yields its members)
+    sensor
+        Name of sensor (attribute) to watch on each component
+    value
+        Sensor value that is counted
+    """
+
+    def __init__(self, components: Iterable[TelstateUpdatingComponent],
+                 sensor: str, value: Any) -> None:
+        # Watch each component only once
+        unique = {id(component): component for component in components}
+        self.components = list(unique.values())
+        self.sensor = sensor
+        self.value = value
+        # Sensors that the condition depends on, as (component, sensor) pairs
+        self.depends = [(component, sensor) for component in self.components]
+        self._matches = {}     # type: Dict[int, bool]
+        for component in self.components:
+            self._matches[id(component)] = same_value(getattr(component, sensor), value)
+            component._watch(sensor, self._changed)
+        self.count = sum(self._matches.values())
+
+    def _changed(self, component: TelstateUpdatingComponent, sensor: str, value: Any) -> None:
+        match = same_value(value, self.value)
+        if match != self._matches[id(component)]:
+            self._matches[id(component)] = match
+            self.count += 1 if match else -1
+
+    def close(self) -> None:
+        """Stop watching the sensors (the count is frozen from now on)."""
+        for component in self.components:
+            component._unwatch(self.sensor, self._changed)
+
+    def __enter__(self) -> 'SensorTally':
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    @abc.abstractmethod
+    def __call__(self) -> bool:
+        """True if the condition holds for the current count."""
+
+    def __repr__(self) -> str:
+        return '<{} {}={!r}: {}/{}>'.format(type(self).__name__, self.sensor, self.value,
+                                            self.count, len(self.components))
+
+
+class AllEqual(SensorTally):
+    """Condition that all components have `sensor` equal to `value`."""
+
+    def __call__(self) -> bool:
+        return self.count == len(self.components)
+
+
+class AnyEqual(SensorTally):
+    """Condition that at least one component has `sensor` equal to `value`."""
+
+    def __call__(self) -> bool:
+        return self.count > 0
@@ -1,44 +1,159 @@
+"""Construct capture sessions from telescope config files.
+
+Turning a config file into components involves parsing the file, loading
+the antenna descriptions of the telescope system and decoding the JSON value
+of every parameter, which adds up for large arrays with bulky parameters
+(such as the SDP config of the 64-antenna simulator). This is therefore done
+in two steps. :func:`compile_config` resolves the config into a plain,
+JSON-friendly description of the component graph (component types, names,
+parameters, rate policies and antenna descriptions), and :func:`build_session`
+constructs the session from that description. Compiled configs are cached
+in memory and on disk, keyed by a hash of the config text, so that repeat
+launches of the same config skip the parsing. The cache lives in the
+directory given by the KATTELMOD_CACHE_DIR environment variable (default
+~/.cache/kattelmod) and can be pre-warmed with
+``python -m kattelmod.config warm sim_64ant_32k.cfg ...``.
+"""
+
+import argparse
+import copy
+import hashlib
 import os.path
+import sys
 from configparser import ConfigParser, Error
 from importlib import import_module
+from typing import List, Dict, Iterable, Sequence, Any, Optional
 
 import kattelmod.systems
-from kattelmod.component import MultiComponent, construct_component
+from kattelmod.component import MultiComponent, RatePolicy, construct_component
+from kattelmod.registry import antennas_file, system_antennas
 
 import json
 
 
-def session_from_config(config_file):
-    # Default place to look for system config files is in systems module
-    systems_path = os.path.dirname(kattelmod.systems.__file__)
-    cfg = ConfigParser(allow_no_value=True)
+# Config parameters with this prefix set the rate policy of the named sensor(s)
+RATE_POLICY_PREFIX = 'rate.'
+# Config parameter that overrides how often the component is updated
+UPDATE_PERIOD = 'update_period'
+# Config parameter listing the components that have to start before this one
+START_AFTER = 'start_after'
+# Group parameters that control the fan-out of MultiComponent method calls
+GROUP_CALL_OPTIONS = ('max_in_flight', 'timeout', 'partial')
+# Bump this whenever the layout of compiled configs changes
+CONFIG_CACHE_VERSION = 2
+# Environment variable that overrides the location of the compiled config cache
+CACHE_DIR_ENV = 'KATTELMOD_CACHE_DIR'
+
+# Default place to look for system config files is in systems module
+_systems_path = os.path.dirname(kattelmod.systems.__file__)
+# Validated compiled configs of this process, keyed by config hash
+_config_cache = {}    # type: Dict[str, Dict[str, Any]]
+
+
+def _pop_rate_policies(params):
+    """Remove rate policy entries from component `params` and return them."""
+    policies = {}
+    for key in [key for key in params if key.startswith(RATE_POLICY_PREFIX)]:
+        try:
+            policies[key[len(RATE_POLICY_PREFIX):]] = RatePolicy(**params.pop(key))
+        except TypeError as e:
+            raise Error(f"Invalid rate policy '{key}': {e}")
+    return policies
+
+
+def _policy_params(policies: Dict[str, RatePolicy]) -> Dict[str, Dict[str, Any]]:
+    """Turn rate `policies` back into (JSON-friendly) constructor parameters."""
+    return {sensor: {'period': policy.period, 'deadband': policy.deadband,
+                     'event': policy.event} for sensor, policy in policies.items()}
+
+
+def _read_config(config_file) -> str:
+    """Text of config file (a filename relative to systems or a file-like object)."""
     # Handle file-like objects separately
     if hasattr(config_file, 'readline'):
-        cfg.readfp(config_file)
-    else:
-        if not os.path.exists(config_file):
-            config_file = os.path.join(systems_path, config_file)
-        files_read = cfg.read(config_file)
-        if files_read != [config_file]:
-            raise Error(f"Could not open config file '{config_file}'")
+        return config_file.read()
+    if not os.path.exists(config_file):
+        config_file = os.path.join(_systems_path, config_file)
+    try:
+        with open(config_file) as f:
+            return f.read()
+    except OSError:
+        raise Error(f"Could not open config file '{config_file}'")
+
+
+def _config_file_error(config_file, error: Error) -> Error:
+    """Copy of `error` that names `config_file`, which the config text does not know."""
+    if hasattr(config_file, 'readline'):
+        config_file = getattr(config_file, 'name', '<stream>')
+    return Error(f"Config file '{config_file}': {error}")
+
+
+def _file_digest(filename: str) -> str:
+    """Hash of the contents of `filename` (empty string if it cannot be read)."""
+    try:
+        with open(filename, 'rb') as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return ''
+
+
+def _config_hash(config_text: str) -> str:
+    version = f'{CONFIG_CACHE_VERSION}\n'.encode()
+    return hashlib.sha256(version + config_text.encode()).hexdigest()
+
+
+def cache_dir() -> str:
+    """Directory where compiled configs are cached on disk."""
+    default = os.path.join(os.path.expanduser('~'), '.cache', 'kattelmod')
+    return os.environ.get(CACHE_DIR_ENV, default)
+
+
+def compile_config(config_text: str) -> Dict[str, Any]:
+    """Resolve config file text into a description of its component graph.
+
+    Parameters
+    ----------
+    config_text
+        Contents of telescope config file
+
+    Returns
+    -------
+    compiled
+        JSON-friendly description of the session, containing the telescope
+        system and the list of its top-level components. Each component has
+        a name, a group flag, group call options and a list of members, where
+        each member has a name, a full component type, parsed parameters
+        (including the antenna description of antenna positioners), rate
+        policies, an optional update period and the names of components that
+        have to start first.
+
+    Raises
+    ------
+    :exc:`configparser.Error`
+        If the config is invalid or refers to an unknown telescope system
+    """
+    cfg = ConfigParser(allow_no_value=True)
+    cfg.read_string(config_text)
     # Get intended telescope system and verify that it is supported
     main = [sect for sect in cfg.sections() if sect.startswith('Telescope')]
     if not main:
-        raise Error(f"Config file '{config_file}' has no Telescope section")
+        raise Error("No Telescope section")
     system = main[0].partition(' ')[2]
     try:
         import_module(f'kattelmod.systems.{system}')
     except ImportError:
         raise Error("Unknown telescope system '{}', expected one of {}"
                     .format(system, kattelmod.telescope_systems))
-    # Load antenna descriptions
-    all_ants = open(os.path.join(systems_path, system, 'antennas.txt')).readlines()
-    all_ants = {line.split(',')[0]: line.strip() for line in all_ants}
-    # Construct all components
+    # Look up antenna descriptions (which are only parsed once they are used)
+    all_ants = system_antennas(system)
+    # Resolve all components
     components = []
     for comp_name, comp_type in cfg.items(f'Telescope {system}'):
         # Expand receptor groups
         group = comp_name.endswith('*') and cfg.has_section(comp_name[:-1])
+        group_policies = {}
+        group_options = {}
+        group_start_after = []
         if group:
             comp_name = comp_name[:-1]
             names = []
@@ -47,24 +162,196 @@ def session_from_config(config_file):
                     names += [name.strip() for name in final.split(',')]
                 elif initial.endswith('+'):
                     names += [initial[:-1] + f for f in final if f in '0123456789']
+                elif initial.startswith(RATE_POLICY_PREFIX):
+                    # Rate policies in the group section apply to all members
+                    group_policies[initial] = json.loads(final)
+                elif initial in GROUP_CALL_OPTIONS:
+                    group_options[initial] = json.loads(final)
+                elif initial == START_AFTER:
+                    # Start-up dependencies in the group section apply to all members
+                    group_start_after = json.loads(final)
+            group_policies = _pop_rate_policies(group_policies)
         else:
             names = [comp_name]
-        comps = []
+        members = []
         for name in names:
             params = {k: json.loads(v) for k, v in cfg.items(name)} \
                 if cfg.has_section(name) else {}
+            policies = {**group_policies, **_pop_rate_policies(params)}
+            update_period = params.pop(UPDATE_PERIOD, None)
+            start_after = params.pop(START_AFTER, group_start_after)
             if comp_type.endswith('AntennaPositioner'):
                 # XXX Complain if antenna is unknown
                 params['observer'] = all_ants.get(name, '')
-            full_comp_type = '.'.join((system, comp_type))
+            members.append({'name': name, 'type': '.'.join((system, comp_type)),
+                            'params': params, 'rate_policies': _policy_params(policies),
+                            'update_period': update_period, 'start_after': start_after})
+        # XXX Complain if members is empty
+        components.append({'name': comp_name, 'group': group,
+                           'options': group_options, 'members': members})
+    return {'version': CONFIG_CACHE_VERSION, 'system': system,
+            'antennas_digest': _file_digest(antennas_file(system)), 'components': components}
+
+
+def build_session(compiled: Dict[str, Any]):
+    """Construct capture session from compiled config (see :func:`compile_config`)."""
+    system = compiled['system']
+    components = []
+    for component in compiled['components']:
+        comps = []
+        for member in component['members']:
+            name = member['name']
+            # Components may modify their parameters, which are shared via the cache
+            params = copy.deepcopy(member['params'])
             try:
-                comp = construct_component(full_comp_type, name, params)
+                comp = construct_component(member['type'], name, params)
             except TypeError as e:
-                raise Error(e.message)
+                raise Error(str(e))
+            if member['rate_policies']:
+                if not hasattr(comp, '_set_rate_policies'):
+                    raise Error(f"Component '{name}' does not support rate policies")
+                comp._set_rate_policies({sensor: RatePolicy(**policy) for sensor, policy
+                                         in member['rate_policies'].items()})
+            if member['update_period'] is not None:
+                comp._update_period = member['update_period']
+            if member['start_after']:
+                comp._start_after = member['start_after']
             comps.append(comp)
-        # XXX Complain if comps is empty
-        components.append(MultiComponent(comp_name, comps) if group else comps[0])
+        components.append(MultiComponent(component['name'], comps, **component['options'])
+                          if component['group'] else comps[0])
     # Construct session object
     module_path = f"kattelmod.systems.{system}.session"
     CaptureSession = getattr(import_module(module_path), 'CaptureSession')
     return CaptureSession(MultiComponent(system, components))
+
+
+def _is_current(compiled: Dict[str, Any]) -> bool:
+    """Check that cached compiled config is still valid for the installed systems."""
+    return (compiled.get('version') == CONFIG_CACHE_VERSION
+            and compiled.get('antennas_digest')
+            == _file_digest(antennas_file(compiled.get('system', ''))))
+
+
+def _load_cached(key: str) -> Optional[Dict[str, Any]]:
+    """Look up compiled config in memory, then on disk (None if missing or stale)."""
+    compiled = _config_cache.get(key)
+    if compiled is not None:
+        # Configs in memory were validated when they got there
+        return compiled
+    try:
+        with open(os.path.join(cache_dir(), key + '.json')) as f:
+            compiled = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not _is_current(compiled):
+        return None
+    _config_cache[key] = compiled
+    return compiled
+
+
+def _store_cached(key: str, compiled: Dict[str, Any]) -> None:
+    """Save compiled config in memory and on disk (ignoring failures to write it)."""
+    _config_cache[key] = compiled
+    directory = cache_dir()
+    filename = os.path.join(directory, key + '.json')
+    try:
+        os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first so that readers never see partial files
+        temp_filename = f'{filename}.{os.getpid()}.tmp'
+        with open(temp_filename, 'w') as f:
+            json.dump(compiled, f)
+        os.replace(temp_filename, filename)
+    except OSError:
+        pass
+
+
+def _compile_cached(config_text: str) -> Dict[str, Any]:
+    key = _config_hash(config_text)
+    compiled = _load_cached(key)
+    if compiled is None:
+        compiled = compile_config(config_text)
+        _store_cached(key, compiled)
+    return compiled
+
+
+def load_compiled_config(config_file, use_cache: bool = True) -> Dict[str, Any]:
+    """Compiled version of `config_file`, from the cache if possible.
+
+    Parameters
+    ----------
+    config_file
+        Name of config file (looked up in the systems directory if it is not
+        found) or file-like object with its contents
+    use_cache
+        True to look up and store the compiled config in the cache
+    """
+    config_text = _read_config(config_file)
+    try:
+        return _compile_cached(config_text) if use_cache else compile_config(config_text)
+    except Error as error:
+        raise _config_file_error(config_file, error) from error
+
+
+def session_from_config(config_file, use_cache: bool = True):
+    """Construct capture session from telescope config file.
+
+    Parameters
+    ----------
+    config_file
+        Name of config file (looked up in the systems directory if it is not
+        found) or file-like object with its contents
+    use_cache
+        True to reuse the compiled config of an earlier launch, if available
+    """
+    compiled = load_compiled_config(config_file, use_cache)
+    try:
+        return build_session(compiled)
+    except Error as error:
+        raise _config_file_error(config_file, error) from error
+
+
+def warm_config_cache(config_files: Iterable[str] = None) -> List[str]:
+    """Compile config files into the cache ahead of time.
+
+    Parameters
+    ----------
+    config_files
+        Names of config files (default is all configs of all systems)
+
+    Returns
+    -------
+    keys
+        Cache keys of the compiled configs
+    """
+    if config_files is None:
+        config_files = sorted(os.path.join(system, filename)
+                              for system in kattelmod.telescope_systems
+                              for filename in os.listdir(os.path.join(_systems_path, system))
+                              if filename.endswith('.cfg'))
+    keys = []
+    for config_file in config_files:
+        config_text = _read_config(config_file)
+        try:
+            _compile_cached(config_text)
+        except Error as error:
+            raise _config_file_error(config_file, error) from error
+        keys.append(_config_hash(config_text))
+    return keys
+
+
+def main(argv: Sequence[str] = None) -> int:
+    parser = argparse.ArgumentParser(description='Manage the compiled config cache.')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    warm = subparsers.add_parser('warm', help='Compile config files into the cache')
+    warm.add_argument('config_files', nargs='*',
+                      help='Config files to compile (default: all system configs)')
+    args = parser.parse_args(argv)
+    if args.command == 'warm':
+        config_files = args.config_files or None
+        keys = warm_config_cache(config_files)
+        print(f'Compiled {len(keys)} config(s) into {cache_dir()}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
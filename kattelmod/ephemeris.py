@@ -0,0 +1,115 @@
+"""Tables of target positions that are cheap to evaluate at any time.
+
+Converting target coordinates to (az, el) via katpoint involves a full
+astropy coordinate transformation, which dominates the cost of simulating
+antennas that track targets for a long time. Target positions change
+smoothly, so an :class:`EphemerisTable` evaluates them in a single
+vectorised call on a coarse time grid and linearly interpolates between
+the grid points. The grid is refined where needed to keep the estimated
+interpolation error within a tolerance.
+"""
+
+from typing import List, Tuple, Dict, Union, Optional
+
+import numpy as np
+from katpoint import Antenna, Target, deg2rad
+
+
+# Spacing of time grid on which positions are calculated, in seconds
+EPHEMERIS_STEP = 10.0
+# Time span of each batch of grid points calculated together, in seconds
+EPHEMERIS_SPAN = 60.0
+# Default maximum interpolation error, in radians (1 arcsecond)
+EPHEMERIS_TOLERANCE = deg2rad(1.0 / 3600.0)
+# Grid spacing below which positions are calculated directly instead
+MIN_EPHEMERIS_STEP = 0.1
+# Maximum number of batches kept per table
+MAX_EPHEMERIS_CHUNKS = 4
+
+TWO_PI = 2.0 * np.pi
+
+# Batch of grid points as (start time, spacing, az, el), or None if direct
+_Chunk = Optional[Tuple[float, float, List[float], List[float]]]
+
+
+class EphemerisTable:
+    """Position of a target as seen by an antenna, interpolated in time.
+
+    Positions are calculated in batches spanning `span` seconds each, on a
+    grid with a spacing of `step` seconds. To check the grid, each batch is
+    evaluated at twice the resolution and the midpoints are compared to the
+    linear interpolation between their neighbours. If this error exceeds
+    `tolerance` (e.g. when the target passes close to the zenith and its
+    azimuth changes quickly) the spacing is halved. The full-resolution
+    grid is then used for interpolation, so that the actual error is about
+    four times smaller than the estimate kept in :attr:`max_error`. Batches
+    that need a spacing below :const:`MIN_EPHEMERIS_STEP` fall back to
+    direct calculation.
+
+    Parameters
+    ----------
+    target
+        Target to track
+    antenna
+        Antenna observing target (default is the default antenna of target)
+    step
+        Initial spacing of time grid, in seconds
+    span
+        Time span of each batch of calculated positions, in seconds
+    tolerance
+        Maximum estimated angular interpolation error, in radians
+
+    Attributes
+    ----------
+    max_error : float
+        Largest estimated interpolation error of all batches so far, in radians
+    """
+
+    def __init__(self, target: Target, antenna: Union[Antenna, str] = None,
+                 step: float = EPHEMERIS_STEP, span: float = EPHEMERIS_SPAN,
+                 tolerance: float = EPHEMERIS_TOLERANCE) -> None:
+        self.target = target
+        self.antenna = antenna if antenna else None
+        self.step = step
+        self.span = span
+        self.tolerance = tolerance
+        self.max_error = 0.0
+        self._chunks = {}    # type: Dict[int, _Chunk]
+
+    def _calculate(self, index: int) -> _Chunk:
+        """Calculate batch of positions number `index` on a fine enough grid."""
+        start = index * self.span
+        step = self.step
+        while step >= MIN_EPHEMERIS_STEP:
+            n_steps = int(np.ceil(self.span / step))
+            times = start + 0.5 * step * np.arange(2 * n_steps + 1)
+            az, el = self.target.azel(times, self.antenna)
+            az = np.unwrap(np.broadcast_to(az, times.shape))
+            el = np.broadcast_to(el, times.shape)
+            # Compare midpoints to interpolation on the coarser grid
+            error_az = np.abs(0.5 * (az[:-2:2] + az[2::2]) - az[1::2]) * np.cos(el[1::2])
+            error_el = np.abs(0.5 * (el[:-2:2] + el[2::2]) - el[1::2])
+            error = max(error_az.max(), error_el.max())
+            if error <= self.tolerance:
+                self.max_error = max(self.max_error, error)
+                return start, 0.5 * step, az.tolist(), el.tolist()
+            step *= 0.5
+        return None
+
+    def azel(self, timestamp: float) -> Tuple[float, float]:
+        """Azimuth and elevation of target at `timestamp`, in radians."""
+        index = int(timestamp // self.span)
+        try:
+            chunk = self._chunks[index]
+        except KeyError:
+            if len(self._chunks) >= MAX_EPHEMERIS_CHUNKS:
+                del self._chunks[next(iter(self._chunks))]
+            chunk = self._chunks[index] = self._calculate(index)
+        if chunk is None:
+            return self.target.azel(timestamp, self.antenna)
+        start, step, az, el = chunk
+        position = (timestamp - start) / step
+        n = min(int(position), len(az) - 2)
+        frac = position - n
+        return ((az[n] + frac * (az[n + 1] - az[n])) % TWO_PI,
+                el[n] + frac * (el[n + 1] - el[n]))
@@ -1,8 +1,13 @@
 import logging
+import threading
 import time
 
 
-def make_record_with_custom_clock(self, *args):
+# The record factory in place before kattelmod, which is used to create records
+_base_record_factory = logging.getLogRecordFactory()
+
+
+def record_with_custom_clock(*args, **kwargs):
     """Create a log record with creation timestamp produced by custom clock.
 
     The custom clock is set on a module level via the monkey-patched
@@ -11,82 +16,151 @@ def make_record_with_custom_clock(self, *args):
     all loggers can have their clocks updated at once without iterating
     over them and reconfiguring them.
 
-    This method should be installed into the default Logger class to have the
-    best chance that all loggers will get it, even ones that have already been
-    instantiated via getLogger in modules that were imported before kattelmod.
-    Someone could still extend the basic Logger class and not call the base
-    makeRecord() somewhere, but this is highly unlikely.
+    This is installed as the log record factory, which serves all loggers
+    (even ones instantiated via getLogger in modules that were imported
+    before kattelmod). The record is left as is if the clock is the default
+    one, and otherwise the custom clock is read once (when the record is
+    made) and that timestamp goes into all timestamp-related fields.
 
     """
-    create_time = logging.clock.time()
-    # Get a log record the usual way, via the monkey-patched original method
-    record = self._makeRecord(*args)
+    clock = logging.clock
+    if clock is time:
+        return _base_record_factory(*args, **kwargs)
+    create_time = clock.time()
+    record = _base_record_factory(*args, **kwargs)
     # Patch all timestamp-related fields
     record.created = create_time
     record.msecs = (create_time - int(create_time)) * 1000
-    record.relativeCreated = (record.created - logging._startTime) * 1000
+    record.relativeCreated = (create_time - logging._startTime) * 1000
     return record
 
 
-# Monkey-patch custom clock and makeRecord method into logging module
-# Mypy does NOT like this, hence all the type: ignore.
+# Monkey-patch custom clock into logging module and install record factory
+# Mypy does NOT like this, hence the type: ignore.
 logging.clock = time                                         # type: ignore
-logging.Logger._makeRecord = logging.Logger.makeRecord       # type: ignore
-logging.Logger.makeRecord = make_record_with_custom_clock    # type: ignore
+logging.setLogRecordFactory(record_with_custom_clock)
+
+
+# Maximum number of script log records buffered between deliveries
+SCRIPT_LOG_CAPACITY = 1000
 
 
-class RobustDeliveryHandler(logging.Handler):
-    """Logging handler that does robust log delivery via a function call.
+class BatchedDeliveryHandler(logging.Handler):
+    """Logging handler that delivers log messages in batches via a function call.
 
-    A custom function provided at initialisation is called to deliver log
-    messages. In addition, a basic lock is used to avoid infinite recursion
-    if the delivery mechanism fails and then attempts to log the error to
-    the same handler. This is threadsafe by virtue of the lock surrounding
-    emit() in the logging.Handler base class.
+    Emitting a record formats it right away (like the `prepare` step of
+    :class:`logging.handlers.QueueHandler`) and puts the message in a bounded
+    buffer, while the messages are delivered later in one batch by
+    :meth:`flush`. If an event loop is provided, the flush is scheduled on it
+    when the first record enters an empty buffer, which keeps the delivery
+    (e.g. telstate updates) out of the code that logs. Records that arrive
+    while the buffer is full are dropped and counted, and the number of
+    dropped records is reported in the next batch. Records logged by the
+    delivery itself (e.g. when delivery fails and logs an error) are
+    skipped (without counting them as dropped), to avoid infinite recursion,
+    while other threads keep on buffering records during a delivery.
 
     Parameters
     ----------
-    deliver : function, signature `deliver(msg)`
-        Function that will deliver log message to the appropriate destination
-
+    deliver : function, signature `deliver(messages)`
+        Function that will deliver a list of (timestamp, message) pairs to
+        the appropriate destination
+    loop : :class:`asyncio.AbstractEventLoop`, optional
+        Event loop that delivers the messages (deliver immediately if None,
+        or if the loop is not running)
+    capacity : int, optional
+        Maximum number of buffered records
+
+    Attributes
+    ----------
+    dropped : int
+        Total number of records dropped due to a full buffer
     """
-    def __init__(self, deliver):
+    def __init__(self, deliver, loop=None, capacity=SCRIPT_LOG_CAPACITY):
         logging.Handler.__init__(self)
         self.deliver = deliver
-        self.busy_emitting = False
+        self.loop = loop
+        self.capacity = capacity
+        self.dropped = 0
+        self._unreported = 0
+        self._buffer = []
+        self._flush_scheduled = False
+        # Identity of thread that is busy delivering messages (None if idle)
+        self._delivering_thread = None
+
+    @property
+    def busy_delivering(self):
+        """True while a batch of messages is being delivered."""
+        return self._delivering_thread is not None
 
     def emit(self, record):
-        """Emit a logging record."""
-        # Do not emit from within emit()
-        # This occurs when deliver() fails and logs an error itself
-        if self.busy_emitting:
+        """Format a logging record, buffer it and arrange for it to be delivered."""
+        if self._delivering_thread == threading.get_ident():
+            # The delivery's own records (e.g. telstate debug lines) are skipped
+            return
+        if len(self._buffer) >= self.capacity:
+            self.dropped += 1
+            self._unreported += 1
             return
         try:
-            self.busy_emitting = True
-            msg = self.format(record)
-            self.deliver(msg)
+            message = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        self._buffer.append((record.created, message))
+        loop = self.loop
+        if loop is not None and loop.is_running() and not loop.is_closed():
+            if not self._flush_scheduled:
+                self._flush_scheduled = True
+                loop.call_soon_threadsafe(self.flush)
+        else:
+            # This also covers a flush that was scheduled on a loop that has
+            # since stopped and might never run it
+            self.flush()
+
+    def flush(self):
+        """Deliver all buffered messages in one batch."""
+        with self.lock:
+            messages, self._buffer = self._buffer, []
+            dropped, self._unreported = self._unreported, 0
+            self._flush_scheduled = False
+        if not messages and not dropped:
+            return
+        if dropped:
+            timestamp = messages[-1][0] if messages else logging.clock.time()
+            messages.append((timestamp, f'[{dropped} log message(s) dropped]'))
+        try:
+            self._delivering_thread = threading.get_ident()
+            self.deliver(messages)
         except (KeyboardInterrupt, SystemExit):
             raise
-        except:
-            self.handleError(record)
+        except Exception:
+            self.handleError(logging.makeLogRecord({'msg': messages[-1][1]}))
         finally:
-            self.busy_emitting = False
+            self._delivering_thread = None
+
+    def close(self):
+        """Deliver what is left in the buffer and close the handler."""
+        self.flush()
+        logging.Handler.close(self)
 
 
-def configure_logging(level, script_log_cmd=None, clock=time, dry_run=False):
+def configure_logging(level, script_log_cmd=None, clock=time, dry_run=False, loop=None):
     """Configure logging system by setting root handlers, level and clock.
 
     Parameters
     ----------
     level : integer or string
         Log level for root logger (will typically apply to all loggers)
-    script_log_cmd : function, signature `script_log_cmd(msg)`, optional
-        Method that will deliver logs to obs component of CaptureSession
-        (remove this handler by default)
+    script_log_cmd : function, signature `script_log_cmd(messages)`, optional
+        Method that will deliver batches of (timestamp, message) pairs to obs
+        component of CaptureSession (remove this handler by default)
     clock : time-like object, optional
         Custom clock used to timestamp all log records (default is usual clock)
     dry_run : {False, True}, optional
         True if doing a dry run, which will mark the logs as such
+    loop : :class:`asyncio.AbstractEventLoop`, optional
+        Event loop that delivers the script log off the logging path
 
     """
     logging.root.setLevel(level)
@@ -95,17 +169,21 @@ def configure_logging(level, script_log_cmd=None, clock=time, dry_run=False):
     if not logging.root.handlers:
         logging.root.addHandler(logging.StreamHandler())
     # Add special script log handler if not there, else update its deliverer
-    # This assumes no more than one RobustDeliveryHandler on root logger
+    # This assumes no more than one BatchedDeliveryHandler on root logger
     for handler in logging.root.handlers:
-        if isinstance(handler, RobustDeliveryHandler):
+        if isinstance(handler, BatchedDeliveryHandler):
+            # Deliver what is buffered before switching (or removing) deliverer
+            handler.flush()
             if script_log_cmd:
                 handler.deliver = script_log_cmd
+                handler.loop = loop
             else:
                 logging.root.removeHandler(handler)
+                handler.close()
             break
     else:
         if script_log_cmd:
-            logging.root.addHandler(RobustDeliveryHandler(script_log_cmd))
+            logging.root.addHandler(BatchedDeliveryHandler(script_log_cmd, loop))
     # Script log formatter has UT timestamps and indication of dry running
     fmt = '%(asctime)s.%(msecs)03dZ %(name)-10s %(levelname)-8s %(message)s'
     if dry_run:
@@ -0,0 +1,159 @@
+"""Pool of KATCP clients that outlive individual capture sessions.
+
+Each :class:`~kattelmod.component.KATCPComponent` used to open a new
+connection when it started and close it when it stopped. An observation
+service that runs back-to-back sessions against the same controllers can
+rather keep the connections open between sessions: components borrow a
+client from the process-wide pool returned by :func:`katcp_pool` and give
+it back when they stop. Clients are tied to the event loop that created
+them, so the pool is keyed by event loop and endpoint. Clients of
+short-lived endpoints (like the product controller of a subarray, which
+goes away when the product is deconfigured) should not be kept, so they
+are returned with ``reuse=False``.
+"""
+
+import asyncio
+import contextlib
+import logging
+from typing import List, Tuple, Dict, Optional
+
+import aiokatcp
+
+from .clock import real_timeout
+
+
+logger = logging.getLogger(__name__)
+
+# Default maximum number of idle clients kept per endpoint
+MAX_IDLE_CLIENTS = 2
+# Default maximum number of idle clients kept in total
+MAX_IDLE_TOTAL = 16
+# Time allowed for the health check of an idle client, in seconds
+HEALTH_CHECK_TIMEOUT = 1.0
+
+_Key = Tuple[asyncio.AbstractEventLoop, str, int]
+
+
+class KATCPPool:
+    """Idle KATCP clients that can be borrowed, keyed by event loop and endpoint.
+
+    An idle client is checked before it is handed out again: it has to be
+    connected and respond to a ``?watchdog`` request within
+    :const:`HEALTH_CHECK_TIMEOUT` seconds. Unhealthy clients are closed and
+    replaced by a fresh connection.
+
+    Parameters
+    ----------
+    max_idle : int, optional
+        Maximum number of idle clients kept per endpoint (extra clients are
+        closed when they are returned)
+    max_idle_total : int, optional
+        Maximum number of idle clients kept for all endpoints together
+    health_check : bool, optional
+        True to check idle clients with a watchdog request before reuse
+
+    Attributes
+    ----------
+    connects : int
+        Number of new connections made by the pool
+    reuses : int
+        Number of times an idle client was handed out again
+    """
+
+    def __init__(self, max_idle: int = MAX_IDLE_CLIENTS, max_idle_total: int = MAX_IDLE_TOTAL,
+                 health_check: bool = True) -> None:
+        self.max_idle = max_idle
+        self.max_idle_total = max_idle_total
+        self.health_check = health_check
+        self.connects = 0
+        self.reuses = 0
+        self._idle = {}     # type: Dict[_Key, List[aiokatcp.Client]]
+        self._keys = {}     # type: Dict[aiokatcp.Client, _Key]
+
+    async def _healthy(self, client: aiokatcp.Client) -> bool:
+        if not client.is_connected:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            async with real_timeout(HEALTH_CHECK_TIMEOUT):
+                await client.request('watchdog')
+        except (asyncio.TimeoutError, aiokatcp.FailReply, ConnectionError) as exc:
+            logger.debug('Idle KATCP client failed health check: %s', exc)
+            return False
+        return True
+
+    async def acquire(self, host: str, port: int) -> aiokatcp.Client:
+        """Borrow a connected client for `host`:`port`, connecting if necessary."""
+        loop = asyncio.get_running_loop()
+        self._forget_closed_loops()
+        key = (loop, host, port)
+        idle = self._idle.get(key, [])
+        while idle:
+            client = idle.pop()
+            if await self._healthy(client):
+                self.reuses += 1
+                return client
+            self._discard(client)
+        client = await aiokatcp.Client.connect(host, port)
+        self.connects += 1
+        self._keys[client] = key
+        return client
+
+    @property
+    def n_idle(self) -> int:
+        """Number of idle clients in the pool."""
+        return sum(len(idle) for idle in self._idle.values())
+
+    async def release(self, client: aiokatcp.Client, reuse: bool = True) -> None:
+        """Return borrowed `client` to the pool (or close it if it is not wanted).
+
+        Pass `reuse` = False to close the client regardless, e.g. when its
+        endpoint is about to disappear.
+        """
+        key = self._keys.get(client)
+        idle = self._idle.setdefault(key, []) if key is not None else []
+        if (reuse and key is not None and client.is_connected and len(idle) < self.max_idle
+                and self.n_idle < self.max_idle_total):
+            idle.append(client)
+        else:
+            self._discard(client)
+            await client.wait_closed()
+
+    def _discard(self, client: aiokatcp.Client) -> None:
+        self._keys.pop(client, None)
+        client.close()
+
+    def _forget_closed_loops(self) -> None:
+        """Close and drop clients of event loops that have been closed."""
+        for key in [key for key in self._idle if key[0].is_closed()]:
+            del self._idle[key]
+        for client in [client for client, key in self._keys.items() if key[0].is_closed()]:
+            del self._keys[client]
+            # This stops reconnection attempts, but the closed loop cannot
+            # schedule the rest, so the socket goes along with the transport
+            with contextlib.suppress(RuntimeError):
+                client.close()
+
+    async def close(self, loop: asyncio.AbstractEventLoop = None) -> None:
+        """Close all idle clients of `loop` (default is the running loop)."""
+        loop = loop if loop is not None else asyncio.get_running_loop()
+        clients = []
+        for key in [key for key in self._idle if key[0] is loop]:
+            clients += self._idle.pop(key)
+        for client in clients:
+            self._keys.pop(client, None)
+            client.close()
+        for client in clients:
+            await client.wait_closed()
+
+
+_pool = None    # type: Optional[KATCPPool]
+
+
+def katcp_pool() -> KATCPPool:
+    """The KATCP client pool shared by all components of the process."""
+    global _pool
+    if _pool is None:
+        _pool = KATCPPool()
+    return _pool
@@ -0,0 +1,106 @@
+"""Profiling of capture sessions, to find out where the time goes."""
+
+import contextlib
+import cProfile
+import json
+import pstats
+import time
+from typing import List, Dict, Iterator, Any, Optional
+
+from .clock import get_clock
+from .updater import DurationStats, UpdaterStats
+
+
+def _durations(stats: DurationStats) -> Dict[str, Any]:
+    return {'count': stats.count, 'total': stats.total,
+            'mean': stats.mean, 'max': stats.max}
+
+
+class SessionProfiler:
+    """Record where wall time goes during a capture session.
+
+    The session wraps each phase of its life cycle (product_configure,
+    starting each component, capture_init, each track, disconnect) in
+    :meth:`phase`, which records its wall time and the simulated time that
+    passed on the session clock. The per-component cost of sensor updates
+    comes from the statistics of the updater. Optionally the whole session
+    also runs under :mod:`cProfile`.
+
+    Parameters
+    ----------
+    filename
+        JSON file that receives the report (the cProfile statistics, if
+        enabled, go to the same filename with '.prof' appended)
+    cprofile
+        True to also profile the session with cProfile
+    top
+        Number of functions to list in the report, by cumulative time
+    """
+
+    def __init__(self, filename: str, cprofile: bool = False, top: int = 30) -> None:
+        self.filename = filename
+        self.top = top
+        self.phases = []     # type: List[Dict[str, Any]]
+        self._profile = cProfile.Profile() if cprofile else None
+        self._start = None   # type: Optional[float]
+        self._stop = None    # type: Optional[float]
+
+    def start(self) -> None:
+        """Start profiling the session as a whole."""
+        self._start = time.perf_counter()
+        if self._profile:
+            self._profile.enable()
+
+    def stop(self) -> None:
+        """Stop profiling the session."""
+        if self._profile:
+            self._profile.disable()
+        self._stop = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Context manager that times the session phase called `name`."""
+        sim_start = get_clock().time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append({'name': name,
+                                'wall_time': time.perf_counter() - start,
+                                'sim_start': sim_start,
+                                'sim_duration': get_clock().time() - sim_start})
+
+    def report(self, updater_stats: UpdaterStats = None) -> Dict[str, Any]:
+        """Collect the profiling results into a JSON-friendly dict."""
+        end = self._stop if self._stop is not None else time.perf_counter()
+        report = {'total_wall_time': end - self._start if self._start is not None else 0.0,
+                  'phases': self.phases}    # type: Dict[str, Any]
+        if updater_stats is not None:
+            names = sorted(set(updater_stats.update_durations)
+                           | set(updater_stats.flush_durations))
+            components = {name: {} for name in names}    # type: Dict[str, Dict[str, Any]]
+            for name, stats in updater_stats.update_durations.items():
+                components[name]['update'] = _durations(stats)
+            for name, stats in updater_stats.flush_durations.items():
+                components[name]['flush'] = _durations(stats)
+            report['updater'] = {'ticks': updater_stats.ticks,
+                                 'overruns': updater_stats.overruns,
+                                 'skipped_ticks': updater_stats.skipped_ticks,
+                                 'tick_latency': _durations(updater_stats.tick_latency),
+                                 'components': components}
+        if self._profile:
+            stats = pstats.Stats(self._profile)
+            functions = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            report['cprofile'] = [
+                {'function': '{}:{}({})'.format(*func), 'calls': calls,
+                 'total_time': total_time, 'cumulative_time': cumulative_time}
+                for func, (_, calls, total_time, cumulative_time, _) in functions[:self.top]
+            ]
+        return report
+
+    def write(self, updater_stats: UpdaterStats = None) -> None:
+        """Write the report (and raw cProfile statistics, if any) to file."""
+        with open(self.filename, 'w') as f:
+            json.dump(self.report(updater_stats), f, indent=2)
+        if self._profile:
+            self._profile.dump_stats(self.filename + '.prof')
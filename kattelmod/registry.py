@@ -0,0 +1,92 @@
+"""Registries of katpoint objects shared by all components of a process.
+
+Constructing katpoint objects from description strings involves parsing
+and coordinate set-up, which adds up when large arrays are configured or
+retargeted. The registries here parse each description only once per
+process. Antenna objects are handed out to every component that asks for
+them and must therefore be treated as immutable, while each request for a
+target gets its own cheap copy of the parsed target.
+"""
+
+import os.path
+from typing import Dict, Union, Optional
+
+from katpoint import Antenna, Target
+
+import kattelmod.systems
+
+
+# Maximum number of parsed targets kept in the target cache
+TARGET_CACHE_SIZE = 4096
+
+# Antenna objects keyed by their description strings
+_antennas = {}            # type: Dict[str, Antenna]
+# Antenna descriptions of each telescope system, keyed by system and antenna name
+_system_antennas = {}     # type: Dict[str, Dict[str, str]]
+# Parsed targets (without antenna) keyed by their description strings, which
+# are never handed out themselves
+_targets = {}             # type: Dict[str, Target]
+
+
+def antennas_file(system: str) -> str:
+    """Name of file containing the antenna descriptions of telescope `system`."""
+    return os.path.join(os.path.dirname(kattelmod.systems.__file__), system, 'antennas.txt')
+
+
+def system_antennas(system: str) -> Dict[str, str]:
+    """Antenna descriptions of telescope `system`, keyed by antenna name.
+
+    The antennas file is only read once per process. The descriptions are
+    kept as strings, so that antennas are only parsed when first used.
+    """
+    try:
+        return _system_antennas[system]
+    except KeyError:
+        with open(antennas_file(system)) as f:
+            descriptions = {line.split(',')[0]: line.strip() for line in f if line.strip()}
+        return _system_antennas.setdefault(system, descriptions)
+
+
+def get_antenna(antenna: Union[str, Antenna]) -> Antenna:
+    """Shared :class:`katpoint.Antenna` object for description `antenna`.
+
+    Antenna objects pass through unchanged.
+    """
+    if isinstance(antenna, Antenna):
+        return antenna
+    try:
+        return _antennas[antenna]
+    except KeyError:
+        return _antennas.setdefault(antenna, Antenna(antenna))
+
+
+def _copy_target(target: Target, antenna: Optional[Antenna]) -> Target:
+    """Copy of `target` with `antenna` as default antenna and its own tags and aliases."""
+    # This is much quicker than copy.copy, which goes via __reduce_ex__
+    new_target = Target.__new__(Target)
+    new_target.__dict__.update(target.__dict__)
+    new_target.tags = list(target.tags)
+    new_target.aliases = list(target.aliases)
+    new_target.antenna = antenna
+    return new_target
+
+
+def get_target(target: Union[str, Target], antenna: Union[str, Antenna] = None) -> Target:
+    """:class:`katpoint.Target` for `target` with `antenna` as default antenna.
+
+    Target descriptions are parsed once per process, and every call returns
+    a fresh copy of the parsed target that the caller is free to modify.
+    Target objects are returned unchanged if they already have `antenna` as
+    default antenna, and otherwise copied (leaving the original untouched).
+    """
+    antenna = get_antenna(antenna) if antenna else None
+    if isinstance(target, Target):
+        return target if target.antenna is antenna else _copy_target(target, antenna)
+    try:
+        parsed = _targets[target]
+    except KeyError:
+        while len(_targets) >= TARGET_CACHE_SIZE:
+            # Evict the oldest target
+            del _targets[next(iter(_targets))]
+        parsed = _targets[target] = Target(target)
+    return _copy_target(parsed, antenna)
@@ -1,17 +1,21 @@
 import logging
 import argparse
 import asyncio
+import contextlib
 import signal
 from typing import (Dict, Generator, Callable, Iterable, Coroutine,   # noqa: F401
-                    Any, Optional, Union, TypeVar)
+                    ContextManager, Tuple, Any, Optional, Union, TypeVar)
 
 from enum import IntEnum
 from katpoint import Timestamp, Catalogue, Target, Antenna
 
 from kattelmod.clock import Clock, WarpEventLoop, get_clock
-from kattelmod.updater import PeriodicUpdater
+from kattelmod.updater import PeriodicUpdater, UpdateScheduler, UpdaterStats
 from kattelmod.logger import configure_logging
-from kattelmod.component import Component, MultiComponent
+from kattelmod.component import Component, MultiComponent, start_components
+from kattelmod.condition import AllEqual
+from kattelmod.pool import katcp_pool
+from kattelmod.profiler import SessionProfiler
 
 
 _T = TypeVar('_T')
@@ -51,6 +55,7 @@ class CaptureSession:
         for comp in components:
             setattr(self, comp._name, comp)
         self._updater = None      # type: Optional[PeriodicUpdater]
+        self._profiler = None     # type: Optional[SessionProfiler]
         self._initial_state = CaptureState.UNKNOWN   # type: CaptureState
         self.state = self._initial_state             # type: CaptureState
         self.targets = False
@@ -83,11 +88,15 @@ class CaptureSession:
         """Current time in UTC seconds since Unix epoch."""
         return get_clock().time()
 
-    async def sleep(self, seconds: float, condition: Callable[[], _T] = None) -> Union[bool, _T]:
+    async def sleep(self, seconds: float, condition: Callable[[], _T] = None,
+                    depends: Iterable[Tuple[Component, str]] = None) -> Union[bool, _T]:
         """Sleep for the requested duration in seconds.
 
         If condition is specified and is satisfied before the sleep interval,
-        returns its value. Otherwise, return False.
+        returns its value. Otherwise, return False. If the condition only
+        depends on component sensors, pass them as (component, sensor name)
+        pairs in `depends` so that it is only checked when they change (see
+        :meth:`PeriodicUpdater.add_condition`).
         """
         if condition is None:
             await asyncio.sleep(seconds)
@@ -95,7 +104,7 @@ class CaptureSession:
         else:
             future = asyncio.get_event_loop().create_future()
             assert self._updater is not None
-            self._updater.add_condition(condition, future)
+            self._updater.add_condition(condition, future, depends)
             try:
                 result = await asyncio.wait_for(future, seconds)
                 return result
@@ -104,6 +113,14 @@ class CaptureSession:
             finally:
                 self._updater.remove_condition(condition, future)
 
+    def _phase(self, name: str) -> ContextManager[None]:
+        """Context manager that profiles a phase of the session (if enabled)."""
+        return self._profiler.phase(name) if self._profiler else contextlib.nullcontext()
+
+    def updater_stats(self) -> Optional[UpdaterStats]:
+        """Timing statistics of sensor updates so far (None if no updater)."""
+        return self._updater.stats if self._updater else None
+
     def argparser(self, *args: Any, **kwargs: Any) -> argparse.ArgumentParser:
         parser = argparse.ArgumentParser(*args, **kwargs)
         parser.add_argument('--config', default='mkat/fake_2ant.cfg')
@@ -114,10 +131,26 @@ class CaptureSession:
         parser.add_argument('--sb-id-code', default=datestr + '-0001')
         parser.add_argument('--dont-stop', action='store_true')
         parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument('--fast-forward', action='store_true',
+                            help='Jump between predicted events in a dry run instead '
+                                 'of updating sensors every update period')
+        parser.add_argument('--sample-period', type=float, default=10.0,
+                            help='Sensor update period while fast-forwarding '
+                                 '(default: %(default)s)')
         parser.add_argument('--log-level', default='INFO')
         parser.add_argument('--start-time')
         parser.add_argument('--clock-ratio', type=float, default=1.0)
         parser.add_argument('--update-period', type=float, default=0.1)
+        parser.add_argument('--profile', metavar='FILE',
+                            help='Write timings of session phases and sensor updates '
+                                 'to this JSON file')
+        parser.add_argument('--cprofile', action='store_true',
+                            help='Also run session under cProfile with --profile '
+                                 '(raw stats go to FILE.prof)')
+        parser.add_argument('--update-overrun', choices=UpdateScheduler.OVERRUN_POLICIES,
+                            default='catch-up',
+                            help='What to do with sensor updates that fall behind '
+                                 'schedule (default: %(default)s)')
         # Positional arguments are assumed to be targets
         if self.targets:
             parser.add_argument('targets', metavar='target', nargs='+')
@@ -159,20 +192,29 @@ class CaptureSession:
     def _configure_logging(self, log_level: Union[int, str] = None, script_log: bool = True) -> None:
         if log_level is None:
             log_level = self.obs_params['log_level']
-        script_log_cmd = None
+        script_log_cmd = loop = None
         if script_log and 'obs' in self:
-            def script_log_cmd(msg):
-                self.obs.script_log = msg
-        configure_logging(log_level, script_log_cmd, get_clock(), self.dry_run)
+            def script_log_cmd(messages):
+                # Keep the time at which each message was logged
+                obs = self.obs
+                update_time = obs._update_time
+                try:
+                    for timestamp, msg in messages:
+                        obs._update_time = timestamp
+                        obs.script_log = msg
+                finally:
+                    obs._update_time = update_time
+            loop = asyncio.get_event_loop()
+        configure_logging(log_level, script_log_cmd, get_clock(), self.dry_run, loop)
 
     async def _start(self, args: argparse.Namespace) -> None:
         # Do product_configure first to get telstate
-        self._initial_state = await self.product_configure(args)
+        with self._phase('product_configure'):
+            self._initial_state = await self.product_configure(args)
         # Now start components to send attributes to telstate (once-off),
         # but delay starting the obs component until capture_init
-        for comp in self.components:
-            if comp._name != 'obs':
-                await comp._start()
+        await start_components([comp for comp in self.components if comp._name != 'obs'],
+                               self._phase)
         # After initial telstate updates it is OK to start periodic updates
         if self._updater:
             self._updater.start()
@@ -205,24 +247,47 @@ class CaptureSession:
 
     async def connect(self, args: argparse.Namespace = None) -> 'CaptureSession':
         self.dry_run = get_clock().rate == 0.0
-        updatable_comps = [c for c in flatten(self.components) if c._updatable]
-        self._updater = PeriodicUpdater(updatable_comps, args.update_period) \
-            if updatable_comps else None
-        # Set up logging once log_level is known and clock is available
-        self._configure_logging(args.log_level)
-        await self._start(args)
-        self.obs_params.update(vars(args))
-        if self._initial_state < CaptureState.INITED:
-            await self.capture_init()
-        if self.targets:
-            self.targets = self.collect_targets(*args.targets)
+        if args.profile:
+            self._profiler = SessionProfiler(args.profile, args.cprofile)
+            self._profiler.start()
+        try:
+            updatable_comps = [c for c in flatten(self.components) if c._updatable]
+            fast_forward = self.dry_run and args.fast_forward
+            period = args.sample_period if fast_forward else args.update_period
+            self._updater = PeriodicUpdater(updatable_comps, period, overrun=args.update_overrun,
+                                            fast_forward=fast_forward) \
+                if updatable_comps else None
+            # Set up logging once log_level is known and clock is available
+            self._configure_logging(args.log_level)
+            await self._start(args)
+            self.obs_params.update(vars(args))
+            if self._initial_state < CaptureState.INITED:
+                with self._phase('capture_init'):
+                    await self.capture_init()
+            if self.targets:
+                self.targets = self.collect_targets(*args.targets)
+        except BaseException:
+            # There will be no disconnect, so finish the profile here
+            self._stop_profiler()
+            raise
         return self
 
     async def disconnect(self) -> None:
-        if self._initial_state < CaptureState.INITED:
-            await self.capture_done()
-        if not self.obs_params['dont_stop']:
-            await self._stop()
+        try:
+            with self._phase('disconnect'):
+                if self._initial_state < CaptureState.INITED:
+                    await self.capture_done()
+                if not self.obs_params['dont_stop']:
+                    await self._stop()
+        finally:
+            self._stop_profiler()
+
+    def _stop_profiler(self) -> None:
+        """Stop profiling the session (if enabled) and write the report."""
+        profiler, self._profiler = self._profiler, None
+        if profiler:
+            profiler.stop()
+            profiler.write(self.updater_stats())
 
     def run(self, args: argparse.Namespace,
             body: Callable[['CaptureSession', argparse.Namespace], Coroutine[Any, Any, _T]]) -> _T:
@@ -245,6 +310,8 @@ class CaptureSession:
             loop.add_signal_handler(signal.SIGINT, task.cancel)
             return loop.run_until_complete(task)
         finally:
+            # Pooled KATCP clients cannot outlive the loop that runs them
+            loop.run_until_complete(katcp_pool().close())
             loop.close()
 
     def new_compound_scan(self) -> Generator['CaptureSession', None, None]:
@@ -275,21 +342,22 @@ class CaptureSession:
 
     async def track(self, target, duration, announce=True):
         self.target = target
-        if announce:
-            self.logger.info("Initiating {:g}-second track on target '{}'"
-                             .format(duration, self.target.name))
-        if 'ants' in self:
-            self.ants.activity = self.obs.activity = 'slew'
-            self.logger.info('slewing to target')
-            # Wait until we are on target
-            cond = lambda: {ant.activity for ant in self.ants} == {'track'}  # noqa: E731
-            await self.sleep(200, cond)
-            self.logger.info('target reached')
-        # Stay on target for desired time
-        self.obs.activity = 'track'
-        self.logger.info('tracking target')
-        await self.sleep(duration)
-        self.logger.info(f'target tracked for {duration:g} seconds')
+        with self._phase(f'track {self.target.name}'):
+            if announce:
+                self.logger.info("Initiating {:g}-second track on target '{}'"
+                                 .format(duration, self.target.name))
+            if 'ants' in self:
+                self.ants.activity = self.obs.activity = 'slew'
+                self.logger.info('slewing to target')
+                # Wait until we are on target
+                with AllEqual(self.ants, 'activity', 'track') as on_target:
+                    await self.sleep(200, on_target)
+                self.logger.info('target reached')
+            # Stay on target for desired time
+            self.obs.activity = 'track'
+            self.logger.info('tracking target')
+            await self.sleep(duration)
+            self.logger.info(f'target tracked for {duration:g} seconds')
         return True
 
     async def product_configure(self, args: argparse.Namespace) -> CaptureState:
@@ -1,29 +1,179 @@
 """Components for a fake telescope."""
 
-from typing import List, Tuple, Dict, Any, Union, Optional
+from typing import List, Tuple, Dict, Sequence, Any, Union, Optional
 
-from katpoint import Antenna, Target, rad2deg, deg2rad, wrap_angle, construct_azel_target
+import numpy as np
+from katpoint import Antenna, Target, rad2deg, deg2rad, wrap_angle
 
 from kattelmod.clock import get_clock
 from kattelmod.component import TelstateUpdatingComponent, TargetObserverMixin
+from kattelmod.ephemeris import EphemerisTable
+from kattelmod.registry import get_target
 from kattelmod.session import CaptureState
 
 
 class Subarray(TelstateUpdatingComponent):
+    # Static sensors don't need frequent updates
+    _update_period = 1.0
+
     def __init__(self, config_label: str = 'unknown', band: str = 'l', product: str = 'c856M4k',
                  dump_rate: float = 1.0, sub_nr: int = 1, pool_resources: str = '') -> None:
         super().__init__()
         self._initialise_attributes(locals())
 
 
+def _angular_separation(az1: np.ndarray, el1: np.ndarray,
+                        az2: np.ndarray, el2: np.ndarray) -> np.ndarray:
+    """Great-circle angle between (az, el) positions, all in degrees."""
+    az1, el1, az2, el2 = deg2rad(az1), deg2rad(el1), deg2rad(az2), deg2rad(el2)
+    sin_half_del = np.sin(0.5 * (el2 - el1))
+    sin_half_daz = np.sin(0.5 * (az2 - az1))
+    hav = sin_half_del ** 2 + np.cos(el1) * np.cos(el2) * sin_half_daz ** 2
+    return rad2deg(2.0 * np.arcsin(np.sqrt(np.clip(hav, 0.0, 1.0))))
+
+
+# Positioner parameters that the group keeps in arrays, and the names of these arrays
+_PARAMETER_ARRAYS = {'real_az_min_deg': 'az_min', 'real_az_max_deg': 'az_max',
+                     'real_el_min_deg': 'el_min', 'real_el_max_deg': 'el_max',
+                     'max_slew_azim_dps': 'max_slew_az', 'max_slew_elev_dps': 'max_slew_el',
+                     'inner_threshold_deg': 'inner_threshold'}
+
+
+class AntennaPositionerGroup:
+    """Array-backed engine that moves a group of fake antenna positioners.
+
+    The dish positions, limits and slew rates of all positioners in the group
+    are kept in NumPy arrays so that the requested positions, slew-rate and
+    limit clamping and lock detection are done for all of them in a single
+    batched pass per timestamp. Each :class:`AntennaPositioner` stays a view
+    onto its row of this state and picks up the results in its own
+    :meth:`AntennaPositioner._update`. Parameters assigned to the whole group
+    via its :class:`MultiComponent` reach the arrays through :meth:`set_values`.
+
+    Parameters
+    ----------
+    positioners : sequence of :class:`AntennaPositioner`
+        Positioners to bind to this group (they are detached from any
+        previous group, keeping their current positions)
+    """
+
+    def __init__(self, positioners: Sequence['AntennaPositioner']) -> None:
+        self.positioners = list(positioners)
+
+        for name in _PARAMETER_ARRAYS:
+            self.set_values(name, [getattr(p, name) for p in self.positioners])
+        n_ants = len(self.positioners)
+        self.az = np.zeros(n_ants)
+        self.el = np.full(n_ants, 90.0)
+        self.requested_az = np.zeros(n_ants)
+        self.requested_el = np.full(n_ants, 90.0)
+        self.active = np.zeros(n_ants, dtype=bool)
+        self.lock = np.zeros(n_ants, dtype=bool)
+        self._last_update = 0.0
+        for n, positioner in enumerate(self.positioners):
+            old_group = positioner._group
+            if old_group is not None:
+                index = positioner._group_index
+                self.az[n], self.el[n] = old_group.az[index], old_group.el[index]
+            positioner._group = self
+            positioner._group_index = n
+
+    def set_values(self, attr_name: str, values: Sequence[float]) -> None:
+        """Take new values of positioner parameter `attr_name` for the whole group."""
+        array_name = _PARAMETER_ARRAYS.get(attr_name)
+        if array_name is not None:
+            setattr(self, array_name, np.array(values, dtype=float))
+
+    def _update(self, timestamp: float) -> None:
+        """Move all positioners in the group to `timestamp` (once per timestamp)."""
+        if timestamp == self._last_update:
+            return
+        elapsed_time = timestamp - self._last_update if self._last_update else 0.0
+        self._last_update = timestamp
+        # Only the requested positions need per-antenna (interpolated) ephemerides
+        active = np.zeros(len(self.positioners), dtype=bool)
+        requested_az, requested_el = self.az.copy(), self.el.copy()
+        for n, positioner in enumerate(self.positioners):
+            activity = positioner.activity
+            if activity in ('error', 'stop'):
+                continue
+            if activity == 'stow':
+                requested_el[n] = 90.0
+            elif positioner.target:
+                az, el = positioner._target_azel(timestamp)
+                requested_az[n] = rad2deg(wrap_angle(az))
+                requested_el[n] = rad2deg(el)
+            else:
+                continue
+            active[n] = True
+        delta_az = wrap_angle(requested_az - self.az, period=360.)
+        delta_el = requested_el - self.el
+        # Truncate velocities to slew rate limits and update position
+        max_delta_az = self.max_slew_az * elapsed_time
+        max_delta_el = self.max_slew_el * elapsed_time
+        az = self.az + np.clip(delta_az, -max_delta_az, max_delta_az)
+        el = self.el + np.clip(delta_el, -max_delta_el, max_delta_el)
+        # Truncate coordinates to antenna limits
+        az = np.clip(az, self.az_min, self.az_max)
+        el = np.clip(el, self.el_min, self.el_max)
+        # Check angular separation to determine lock
+        error = _angular_separation(requested_az, requested_el, az, el)
+        self.az = np.where(active, az, self.az)
+        self.el = np.where(active, el, self.el)
+        self.requested_az, self.requested_el = requested_az, requested_el
+        self.active = active
+        self.lock = error < self.inner_threshold
+
+    def predict_lock(self, n: int, iterations: int = 3) -> float:
+        """Predict when positioner `n` will lock onto its target.
+
+        Starting from its position at the last update, the slew time is the
+        time needed by the slower axis to reach the target at full slew rate.
+        Since the target moves in the meantime, the requested position is
+        re-evaluated at the predicted arrival time a few times, which
+        converges quickly as targets move much slower than the dishes.
+
+        Returns
+        -------
+        lock_time
+            Predicted lock timestamp (infinite if the positioner is not
+            slewing or will never reach its target due to limits)
+        """
+        positioner = self.positioners[n]
+        if positioner.activity != 'slew' or not positioner.target:
+            return np.inf
+        start = self._last_update
+        slew_time = 0.0
+        for _ in range(iterations):
+            az, el = positioner._target_azel(start + slew_time)
+            delta_az = wrap_angle(rad2deg(wrap_angle(az)) - self.az[n], period=360.)
+            delta_el = rad2deg(el) - self.el[n]
+            if not (self.az_min[n] <= self.az[n] + delta_az <= self.az_max[n]
+                    and self.el_min[n] <= self.el[n] + delta_el <= self.el_max[n]):
+                return np.inf
+            slew_time = max(abs(delta_az) / self.max_slew_az[n],
+                            abs(delta_el) / self.max_slew_el[n])
+        return start + slew_time
+
+
 class AntennaPositioner(TargetObserverMixin, TelstateUpdatingComponent):
+    # Let MultiComponent move a group of these with a single array-backed engine
+    _group_engine = AntennaPositionerGroup
+    # Set by a fast-forwarding updater, which only updates us occasionally
+    _fast_forward = False
+
     def __init__(self, observer: str = '',
                  real_az_min_deg: float = -185.0, real_az_max_deg: float = 275.0,
                  real_el_min_deg: float = 15.0, real_el_max_deg: float = 92.0,
                  max_slew_azim_dps: float = 2.0, max_slew_elev_dps: float = 1.0,
                  inner_threshold_deg: float = 0.01) -> None:
         super().__init__()
+        self._group = None        # type: Optional[AntennaPositionerGroup]
+        self._group_index = 0
+        self._ephemeris = None    # type: Optional[EphemerisTable]
         self._initialise_attributes(locals())
+        # Start off in a group of one until MultiComponent regroups us
+        AntennaPositionerGroup([self])
         self.activity = 'stop'
         self.target = ''
         self.pos_actual_scan_azim = self.pos_request_scan_azim = 0.0
@@ -34,52 +184,61 @@ class AntennaPositioner(TargetObserverMixin, TelstateUpdatingComponent):
         return self._target
     @target.setter  # noqa: E301
     def target(self, target: Union[str, Target]) -> None:
-        new_target = Target(target, antenna=self._observer) if target else ''
+        new_target = get_target(target, self.observer) if target else ''
+        if self._fast_forward and self._group._last_update and not self._update_time:
+            # Move the dish along the old target up to now before switching,
+            # since the next update might be a long time from now
+            self._group._update(get_clock().time())
         if new_target != self._target and self.activity in ('scan', 'track', 'slew'):
             self.activity = 'slew' if new_target else 'stop'
         self._target = new_target
 
+    def _target_azel(self, timestamp: float) -> Tuple[float, float]:
+        """Position of target at `timestamp`, interpolated from its ephemeris."""
+        if self._ephemeris is None or self._ephemeris.target is not self._target:
+            self._ephemeris = EphemerisTable(self._target, self.observer)
+        return self._ephemeris.azel(timestamp)
+
+    @property
+    def pos_actual_scan_azim(self) -> float:
+        return float(self._group.az[self._group_index])
+    @pos_actual_scan_azim.setter  # noqa: E301
+    def pos_actual_scan_azim(self, az: float) -> None:
+        self._group.az[self._group_index] = az
+
+    @property
+    def pos_actual_scan_elev(self) -> float:
+        return float(self._group.el[self._group_index])
+    @pos_actual_scan_elev.setter  # noqa: E301
+    def pos_actual_scan_elev(self, el: float) -> None:
+        self._group.el[self._group_index] = el
+
+    def _next_event(self) -> float:
+        """Predicted time at which the activity will change by itself."""
+        return float(self._group.predict_lock(self._group_index))
+
     def _update(self, timestamp: float) -> None:
         super()._update(timestamp)
-        elapsed_time = self._elapsed_time
-        if self.activity in ('error', 'stop'):
-            return
-        az, el = self.pos_actual_scan_azim, self.pos_actual_scan_elev
-        target = construct_azel_target(deg2rad(az), deg2rad(90.0)) \
-            if self.activity == 'stow' else self.target
-        if not target:
+        group, n = self._group, self._group_index
+        # The first positioner to be updated moves the whole group
+        group._update(timestamp)
+        if not group.active[n]:
             return
-        requested_az, requested_el = target.azel(timestamp, self.observer)
-        requested_az = rad2deg(wrap_angle(requested_az))
-        requested_el = rad2deg(requested_el)
-        delta_az = wrap_angle(requested_az - az, period=360.)
-        delta_el = requested_el - el
-        # Truncate velocities to slew rate limits and update position
-        max_delta_az = self.max_slew_azim_dps * elapsed_time
-        max_delta_el = self.max_slew_elev_dps * elapsed_time
-        az += min(max(delta_az, -max_delta_az), max_delta_az)
-        el += min(max(delta_el, -max_delta_el), max_delta_el)
-        # Truncate coordinates to antenna limits
-        az = min(max(az, self.real_az_min_deg), self.real_az_max_deg)
-        el = min(max(el, self.real_el_min_deg), self.real_el_max_deg)
-        # Check angular separation to determine lock
-        dish = construct_azel_target(deg2rad(az), deg2rad(el))
-        error = rad2deg(target.separation(dish, timestamp, self.observer))
-        lock = error < self.inner_threshold_deg
+        lock = group.lock[n]
         if lock and self.activity == 'slew':
             self.activity = 'track'
         elif not lock and self.activity == 'track':
             self.activity = 'slew'
         # Update position sensors
-        self.pos_request_scan_azim = requested_az
-        self.pos_request_scan_elev = requested_el
-        self.pos_actual_scan_azim = az
-        self.pos_actual_scan_elev = el
-        # print 'elapsed: %g, max_daz: %g, max_del: %g, daz: %g, del: %g, error: %g' % \
-        #       (elapsed_time, max_delta_az, max_delta_el, delta_az, delta_el, error)
+        self.pos_request_scan_azim = float(group.requested_az[n])
+        self.pos_request_scan_elev = float(group.requested_el[n])
+        self.pos_actual_scan_azim = float(group.az[n])
+        self.pos_actual_scan_elev = float(group.el[n])
 
 
 class Environment(TelstateUpdatingComponent):
+    _update_period = 1.0
+
     def __init__(self) -> None:
         super().__init__()
         self._initialise_attributes(locals())
@@ -17,6 +17,8 @@ obs = fake.Observation
 
 [ants]
 names = ${ants}
+rate.pos_actual_scan_* = {"period": 0.4, "deadband": 0.001}
+rate.pos_request_scan_* = {"period": 0.4, "deadband": 0.001}
 
 [sub]
 product = "kattelmod"
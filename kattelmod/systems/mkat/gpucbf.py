@@ -26,7 +26,8 @@ class CorrelatorBeamformer(TargetObserverMixin, TelstateUpdatingComponent):
             raise ComponentNotReadyError(
                 f'Product controller already configured ({self._client._endpoint})'
             )
-        self._client = KATCPComponent(endpoint)
+        # The product controller disappears when the product is deconfigured
+        self._client = KATCPComponent(endpoint, pooled=False)
         await self._client._start()
 
     async def product_deconfigure(self) -> None:
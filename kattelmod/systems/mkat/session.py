@@ -1,5 +1,5 @@
 import argparse
-from typing import Any, Iterable, Union
+from typing import Any, Iterable, Optional, Union
 
 from katpoint import Timestamp
 from katsdptelstate.aio import TelescopeState
@@ -7,6 +7,7 @@ from katsdptelstate.aio.redis import RedisBackend
 
 from kattelmod.session import CaptureSession as BaseCaptureSession, CaptureState
 from kattelmod.component import Component, MultiComponent
+from kattelmod.telstate import TelstateWriter, RedisTraffic, trace_redis
 
 
 class CaptureSession(BaseCaptureSession):
@@ -16,12 +17,30 @@ class CaptureSession(BaseCaptureSession):
         super().__init__(components)
         # Start off with a "fake" in-memory telstate
         self.telstate = self.components._telstate = TelescopeState()
+        # All components send their sensor updates through a shared writer
+        self.telstate_writer = self.components._writer = TelstateWriter()
+        # Traffic to a Redis telstate, if traced
+        self.telstate_traffic = None    # type: Optional[RedisTraffic]
 
     def argparser(self, *args: Any, **kwargs: Any) -> argparse.ArgumentParser:
         parser = super().argparser(*args, **kwargs)
-        parser.add_argument('--telstate', help="Override telstate (host:port or 'fake')")
+        parser.add_argument('--telstate',
+                            help="Override telstate (host:port, 'fake' for an in-memory "
+                                 "one or 'fakeredis' for a Redis stand-in)")
+        parser.add_argument('--trace-telstate', action='store_true',
+                            help='Count round trips and bytes sent to a Redis telstate')
+        parser.add_argument('--dedupe-sensors', action='store_true',
+                            help="Don't send unchanged sensor values to telstate")
+        parser.add_argument('--sensor-keep-alive', type=float, default=10.0,
+                            help='Resend unchanged sensor values after this many '
+                                 'seconds with --dedupe-sensors (default=%(default)s)')
         return parser
 
+    async def connect(self, args: argparse.Namespace = None) -> 'CaptureSession':
+        self.telstate_writer.dedupe = args.dedupe_sensors
+        self.telstate_writer.keep_alive = args.sensor_keep_alive
+        return await super().connect(args)
+
     async def _set_telstate(self, args: argparse.Namespace) -> None:
         """Determine telstate endpoint and connect to it if not fake."""
         if getattr(args, 'telstate', None):
@@ -31,9 +50,20 @@ class CaptureSession(BaseCaptureSession):
         else:
             endpoint = 'fake'
 
-        if endpoint != 'fake':
+        if endpoint == 'fakeredis':
+            # Exercise the real RedisBackend code without needing a server
+            try:
+                import fakeredis.aioredis
+            except ImportError:
+                raise ValueError("The 'fakeredis' telstate needs the fakeredis package") from None
+            backend = RedisBackend(fakeredis.aioredis.FakeRedis())
+        elif endpoint != 'fake':
             backend = await RedisBackend.from_url(f'redis://{endpoint}')
-            self.telstate = self.components._telstate = TelescopeState(backend)
+        else:
+            return
+        if getattr(args, 'trace_telstate', False):
+            self.telstate_traffic = trace_redis(backend)
+        self.telstate = self.components._telstate = TelescopeState(backend)
 
     async def product_configure(self, args: argparse.Namespace) -> CaptureState:
         initial_state = CaptureState.UNKNOWN
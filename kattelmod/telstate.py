@@ -0,0 +1,389 @@
+"""Efficient delivery of sensor updates to telstate."""
+
+import asyncio
+import math
+import re
+import sys
+import time
+import weakref
+from collections import deque
+from typing import List, Tuple, Dict, Deque, Any, Optional
+
+from katsdptelstate import ImmutableKeyError
+from katsdptelstate.aio import TelescopeState
+from katsdptelstate.aio.redis import RedisBackend
+from katsdptelstate.encoding import encode_value
+from katsdptelstate.utils import ensure_binary, display_str, pack_timestamp
+from redis.exceptions import NoScriptError, ResponseError
+
+if sys.version_info >= (3, 9):
+    import importlib.resources as importlib_resources
+else:
+    import importlib_resources
+
+
+# A sensor update is (key, value, timestamp, immutable)
+SensorUpdate = Tuple[str, Any, float, bool]
+
+
+class WriteStats:
+    """Counters of telstate writes, to show the effect of batching.
+
+    Attributes
+    ----------
+    batches : int
+        Number of batches sent to telstate
+    batched_writes : int
+        Number of sensor updates that were sent as part of a batch
+    individual_writes : int
+        Number of sensor updates that needed their own telstate call
+    suppressed_writes : int
+        Number of sensor updates dropped because the value did not change
+    dropped_writes : int
+        Number of sensor updates dropped because too many were queued already
+    """
+
+    def __init__(self) -> None:
+        self.batches = 0
+        self.batched_writes = 0
+        self.individual_writes = 0
+        self.suppressed_writes = 0
+        self.dropped_writes = 0
+
+    def __repr__(self) -> str:
+        return ('<WriteStats batches={} batched_writes={} individual_writes={} '
+                'suppressed_writes={} dropped_writes={}>'
+                .format(self.batches, self.batched_writes, self.individual_writes,
+                        self.suppressed_writes, self.dropped_writes))
+
+
+class RedisTraffic:
+    """Counters of traffic between a Redis client and its server.
+
+    A round trip is a write of one or more commands to the server (a whole
+    pipeline goes out as a single write), and its latency is the time until
+    the first response to it has been read.
+
+    Attributes
+    ----------
+    round_trips : int
+        Number of writes to the server
+    bytes_written : int
+        Number of bytes sent to the server
+    latency_total, latency_max : float
+        Total and maximum round-trip latency, in seconds
+    """
+
+    def __init__(self) -> None:
+        self.round_trips = 0
+        self.bytes_written = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    def copy(self) -> 'RedisTraffic':
+        traffic = RedisTraffic()
+        traffic.__dict__.update(self.__dict__)
+        return traffic
+
+    def __sub__(self, other: 'RedisTraffic') -> 'RedisTraffic':
+        """Traffic since snapshot `other` was taken (the maximum is not adjusted)."""
+        traffic = self.copy()
+        traffic.round_trips -= other.round_trips
+        traffic.bytes_written -= other.bytes_written
+        traffic.latency_total -= other.latency_total
+        return traffic
+
+    def __repr__(self) -> str:
+        return ('<RedisTraffic round_trips={} bytes_written={} latency_total={:g} '
+                'latency_max={:g}>'.format(self.round_trips, self.bytes_written,
+                                           self.latency_total, self.latency_max))
+
+
+def trace_redis(backend: RedisBackend) -> RedisTraffic:
+    """Count the traffic of all new connections of the Redis `backend`.
+
+    This works with both real Redis clients and fakeredis, since it hooks into
+    the connection class used by the connection pool of the client (and
+    converts connections that are already in the pool).
+    """
+    traffic = RedisTraffic()
+    pool = backend.client.connection_pool
+    base = pool.connection_class
+
+    class TracedConnection(base):      # type: ignore
+        _sent_at = None
+
+        async def send_packed_command(self, command, *args, **kwargs):
+            if isinstance(command, (bytes, str)):
+                traffic.bytes_written += len(command)
+            else:
+                command = list(command)
+                traffic.bytes_written += sum(len(chunk) for chunk in command)
+            traffic.round_trips += 1
+            self._sent_at = time.perf_counter()
+            return await super().send_packed_command(command, *args, **kwargs)
+
+        async def read_response(self, *args, **kwargs):
+            try:
+                return await super().read_response(*args, **kwargs)
+            finally:
+                if self._sent_at is not None:
+                    latency = time.perf_counter() - self._sent_at
+                    traffic.latency_total += latency
+                    traffic.latency_max = max(traffic.latency_max, latency)
+                    self._sent_at = None
+
+    pool.connection_class = TracedConnection
+    existing = list(getattr(pool, '_available_connections', [])) + \
+        list(getattr(pool, '_in_use_connections', []))
+    for connection in existing:
+        if type(connection) is base:
+            connection.__class__ = TracedConnection
+    return traffic
+
+
+# Lua script that adds a value to a mutable key, as shipped with katsdptelstate
+_add_mutable_script = None     # type: Optional[bytes]
+# The script registered with each Redis backend
+_add_mutable_scripts = weakref.WeakKeyDictionary()    # type: weakref.WeakKeyDictionary
+
+
+def _add_mutable(backend: RedisBackend) -> Any:
+    """The add_mutable Lua script of katsdptelstate, registered with Redis `backend`."""
+    global _add_mutable_script
+    script = _add_mutable_scripts.get(backend)
+    if script is None:
+        if _add_mutable_script is None:
+            package_files = importlib_resources.files('katsdptelstate')
+            path = package_files.joinpath('lua_scripts/add_mutable.lua')
+            _add_mutable_script = path.read_bytes()
+        script = _add_mutable_scripts[backend] = \
+            backend.client.register_script(_add_mutable_script)
+    return script
+
+
+def _is_wrongtype(error: ResponseError) -> bool:
+    """True if Redis `error` (possibly from inside a script) is due to a key of another type."""
+    message = str(error.args[0]) if error.args else ''
+    # Errors of pipelined commands are prefixed by the (arbitrary) command
+    return 'WRONGTYPE ' in message.rpartition(' of pipeline caused error: ')[2]
+
+
+def _failed_command(error: ResponseError) -> Optional[int]:
+    """Index of the pipelined command that caused Redis `error`, if known."""
+    message = str(error.args[0]) if error.args else ''
+    # Pipeline errors start with the (1-based) number of the failed command
+    match = re.match(r'Command # (\d+) ', message)
+    return int(match.group(1)) - 1 if match else None
+
+
+def _is_valid_timestamp(ts: float) -> bool:
+    return not (math.isnan(ts) or math.isinf(ts)) and ts >= 0.0
+
+
+def same_value(a: Any, b: Any) -> bool:
+    """True if sensor values `a` and `b` are definitely equal."""
+    try:
+        return type(a) is type(b) and bool(a == b)
+    except ValueError:
+        # Multi-element arrays have an ambiguous truth value
+        return False
+
+
+async def add_many(telstate: TelescopeState, updates: List[SensorUpdate],
+                   stats: Optional[WriteStats] = None) -> None:
+    """Add a batch of sensor updates to `telstate` in one go.
+
+    Mutable updates headed for a Redis backend are pipelined so that the whole
+    batch costs a single round trip. Other backends (like the in-memory one)
+    have no round trips to save and simply get the updates in order. Immutable
+    keys and updates with invalid timestamps go through the normal
+    :meth:`TelescopeState.add` path, which does the full validation and error
+    reporting. Like that path, the batch raises :exc:`ImmutableKeyError` if
+    one of its keys turns out to be immutable.
+
+    Parameters
+    ----------
+    telstate
+        Telescope state (or view) that receives the updates
+    updates
+        Sensor updates as (key, value, timestamp, immutable) tuples
+    stats
+        Counters to update, if given
+    """
+    stats = stats if stats is not None else WriteStats()
+    backend = telstate.backend
+    batched = []       # type: List[SensorUpdate]
+    for update in updates:
+        key, value, ts, immutable = update
+        if immutable or not _is_valid_timestamp(ts):
+            await telstate.add(key, value, ts=ts, immutable=immutable)
+            stats.individual_writes += 1
+        else:
+            batched.append(update)
+    if not batched:
+        return
+    if isinstance(backend, RedisBackend):
+        prefix = ensure_binary(telstate.prefixes[0])
+        commands = [(prefix + ensure_binary(key), pack_timestamp(ts) + encode_value(value))
+                    for key, value, ts, _ in batched]
+        # The Lua script is the one used by RedisBackend.add_mutable. Calling
+        # it by SHA avoids the SCRIPT EXISTS round trip that redis-py adds to
+        # every pipeline that runs scripts, so the script is only loaded when
+        # the server does not know it yet.
+        add_mutable = _add_mutable(backend)
+        for attempt in range(2):
+            pipe = backend.client.pipeline(transaction=False)
+            for full_key, packed in commands:
+                pipe.evalsha(add_mutable.sha, 1, full_key, packed)
+            try:
+                await pipe.execute()
+                break
+            except NoScriptError:
+                if attempt:
+                    raise
+                await backend.client.script_load(add_mutable.script)
+            except ResponseError as error:
+                if _is_wrongtype(error):
+                    index = _failed_command(error)
+                    if index is None or index >= len(commands):
+                        raise ImmutableKeyError('Attempt to change a key in the batch to mutable')
+                    raise ImmutableKeyError('Attempt to change key {} to mutable'
+                                            .format(display_str(commands[index][0])))
+                raise
+    else:
+        for key, value, ts, _ in batched:
+            await telstate.add(key, value, ts=ts)
+    stats.batches += 1
+    stats.batched_writes += len(batched)
+
+
+class TelstateWriter:
+    """Pipeline that delivers sensor updates from many components to telstate.
+
+    Components hand their sensor updates to :meth:`add` (which is cheap and
+    synchronous) and the writer sends everything that accumulated during a
+    pass of the event loop as one batch, regardless of how many components
+    contributed to it. Updates are ordered by timestamp within each batch
+    and batches are sent strictly in sequence. A capture session shares a
+    single writer between all its components, so that the cost of an update
+    cycle scales with the number of changed sensors rather than the number of
+    components.
+
+    The number of queued updates is bounded by `max_pending`. Updates added
+    synchronously (typically from `__setattr__`) cannot wait for room, so
+    once the queue is full :meth:`add` drops further mutable updates (and
+    counts them in `stats.dropped_writes`) until batches have been sent.
+    Immutable and initial updates are never dropped, since telstate would
+    otherwise miss them for good. Producers that can wait should rather use
+    :meth:`put`, which waits until there is room in the queue. Batches are
+    also capped at `max_pending` updates, and a new batch is started straight
+    away if the current one fills up.
+
+    In dedupe mode a mutable sensor update is dropped if its value is the
+    same as the last value sent to the same key of the same telstate, unless
+    `keep_alive` seconds have passed since then, so that consumers still see
+    periodic refreshes. Components call :meth:`forget_sent` when they start,
+    so that a new session does not inherit the values sent by the last one.
+
+    Parameters
+    ----------
+    max_pending
+        Maximum number of queued updates and of updates in a single batch
+    dedupe
+        True to suppress updates that do not change the sensor value
+    keep_alive
+        Resend unchanged sensor values after this many seconds in dedupe
+        mode (None means never)
+    """
+
+    def __init__(self, max_pending: int = 10000, dedupe: bool = False,
+                 keep_alive: Optional[float] = 10.0) -> None:
+        self.max_pending = max_pending
+        self.dedupe = dedupe
+        self.keep_alive = keep_alive
+        self.stats = WriteStats()
+        # Last (value, timestamp) sent per (backend id, prefix, key), for dedupe mode
+        self._last_sent = {}     # type: Dict[Tuple[int, str, str], Tuple[Any, float]]
+        # Maximum number of updates that were queued but not yet sent
+        self.max_depth = 0
+        self._depth = 0
+        self._batch = None       # type: Optional[List[Tuple[Any, SensorUpdate]]]
+        self._send_tasks = deque()     # type: Deque[asyncio.Task]
+        self._send_lock = None   # type: Optional[asyncio.Lock]
+        # Set whenever a batch has been sent, to wake up waiting producers
+        self._room = None        # type: Optional[asyncio.Event]
+
+    @property
+    def depth(self) -> int:
+        """Number of updates that are queued but not sent yet."""
+        return self._depth
+
+    def forget_sent(self) -> None:
+        """Forget the values sent so far, so that dedupe mode sends them again."""
+        self._last_sent.clear()
+
+    def add(self, telstate: TelescopeState, update: SensorUpdate,
+            initial: bool = False) -> None:
+        """Queue sensor update destined for `telstate` (or a view of it).
+
+        An `initial` update is never suppressed in dedupe mode, nor dropped
+        when the queue is full.
+        """
+        key, value, ts, immutable = update
+        full_key = None
+        if self.dedupe and not immutable:
+            full_key = (id(telstate.backend), telstate.prefixes[0], key)
+            last = self._last_sent.get(full_key)
+            if not initial and last is not None and same_value(value, last[0]) and (
+                    self.keep_alive is None or ts - last[1] < self.keep_alive):
+                self.stats.suppressed_writes += 1
+                return
+        if self._depth >= self.max_pending and not (immutable or initial):
+            self.stats.dropped_writes += 1
+            return
+        if full_key is not None:
+            self._last_sent[full_key] = (value, ts)
+        if self._batch is None or len(self._batch) >= self.max_pending:
+            self._batch = []
+            send_task = asyncio.get_event_loop().create_task(self._send(self._batch))
+            self._send_tasks.append(send_task)
+        self._batch.append((telstate, update))
+        self._depth += 1
+        self.max_depth = max(self.max_depth, self._depth)
+
+    async def put(self, telstate: TelescopeState, update: SensorUpdate) -> None:
+        """Queue sensor update once fewer than `max_pending` updates are queued."""
+        while self._depth >= self.max_pending:
+            if self._room is None:
+                self._room = asyncio.Event()
+            self._room.clear()
+            await self._room.wait()
+        self.add(telstate, update)
+
+    async def _send(self, batch: List[Tuple[Any, SensorUpdate]]) -> None:
+        # Any updates added from now on go into a new batch
+        if self._batch is batch:
+            self._batch = None
+        if self._send_lock is None:
+            self._send_lock = asyncio.Lock()
+        async with self._send_lock:
+            # Group updates by telstate view (in order of appearance) and
+            # sort each group by timestamp (sort is stable for equal times)
+            groups = {}      # type: Dict[int, Tuple[Any, List[SensorUpdate]]]
+            for telstate, update in batch:
+                groups.setdefault(id(telstate), (telstate, []))[1].append(update)
+            try:
+                for telstate, updates in groups.values():
+                    updates.sort(key=lambda update: update[2])
+                    await add_many(telstate, updates, self.stats)
+            finally:
+                self._depth -= len(batch)
+                if self._room is not None:
+                    self._room.set()
+
+    async def flush(self) -> None:
+        """Wait until all queued sensor updates have been sent to telstate."""
+        while self._send_tasks:
+            send_task = self._send_tasks.popleft()
+            await send_task
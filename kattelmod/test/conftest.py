@@ -0,0 +1,12 @@
+import pytest
+
+from kattelmod import config
+
+
+@pytest.fixture(autouse=True)
+def config_cache(tmp_path, monkeypatch):
+    """Keep compiled configs of each test out of the user's cache directory."""
+    cache = tmp_path / 'config_cache'
+    monkeypatch.setenv(config.CACHE_DIR_ENV, str(cache))
+    monkeypatch.setattr(config, '_config_cache', {})
+    return cache
@@ -0,0 +1,30 @@
+"""Unit tests for the dry-run batch runner."""
+
+import os.path
+
+import kattelmod.test
+from kattelmod.batch import run_batch, summary
+
+
+testpath = os.path.dirname(kattelmod.test.__file__)
+
+
+def test_run_batch():
+    script = os.path.join(testpath, 'basic_track.py')
+    start_times = ['2016-02-25 10:14:00', '2016-02-25 11:14:00']
+    configs = ['mkat/fake_2ant.cfg', 'missing.cfg']
+    results = run_batch(script, start_times, configs, ['-t', '10', 'Sun, special'], jobs=2)
+    assert [(r.config, r.start_time) for r in results] == \
+        [(config, start_time) for config in configs for start_time in start_times]
+    for result in results[:2]:
+        assert result.success
+        assert result.error == ''
+        # Slew plus 10-second track, in simulated time
+        assert result.sim_duration > 10.0
+        assert any('target tracked for 10 seconds' in line for line in result.script_log)
+        assert '--dry-run' in result.args
+    for result in results[2:]:
+        assert not result.success
+        assert 'missing.cfg' in result.error
+    report = summary(results)
+    assert '4 runs, 2 failed' in report
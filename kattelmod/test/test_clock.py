@@ -75,6 +75,44 @@ def test_warp_clock():
     assert clock.monotonic() == monotonic_start + 3.5
 
 
+class FakeTime:
+    """Stand-in for the time module whose time only moves when told to."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def time(self) -> float:
+        return self.now
+
+    def monotonic(self) -> float:
+        return self.now - 900.0
+
+    def sleep(self, seconds: float) -> None:
+        self.now += seconds
+
+
+def test_set_rate(monkeypatch):
+    """Changing the rate keeps the clock continuous"""
+    fake_time = FakeTime()
+    monkeypatch.setattr('kattelmod.clock.time', fake_time)
+    clock = Clock(1.0, START_TIME)
+    fake_time.sleep(0.2)
+    time1 = clock.time()
+    mono1 = clock.monotonic()
+    assert time1 == pytest.approx(START_TIME + 0.2)
+    clock.set_rate(0.5)
+    assert clock.rate == 0.5
+    assert clock.time() == pytest.approx(time1)
+    assert clock.monotonic() == pytest.approx(mono1)
+    fake_time.sleep(0.2)
+    assert clock.time() == pytest.approx(time1 + 0.4)
+    assert clock.monotonic() == pytest.approx(mono1 + 0.4)
+    with pytest.raises(ValueError):
+        clock.set_rate(0.0)
+    with pytest.raises(TypeError):
+        Clock(0.0).set_rate(1.0)
+
+
 def run_with_loop(func):
     @functools.wraps(func)
     def wrapper(*args, **kwargs):
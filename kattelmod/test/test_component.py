@@ -1,12 +1,15 @@
 import asyncio
 import async_solipsism
+import contextlib
 from unittest import mock
 
 import katsdptelstate.aio
 
 import kattelmod
-from kattelmod.component import Component, TelstateUpdatingComponent, KATCPComponent, MultiMethod
+from kattelmod.component import (Component, TelstateUpdatingComponent, KATCPComponent, MultiMethod,
+                                 MultiComponent, RatePolicy, start_components)
 from kattelmod.clock import get_clock
+from kattelmod.pool import katcp_pool
 from kattelmod.test.test_clock import WarpEventLoopTestCase
 import re
 import pytest
@@ -44,6 +47,25 @@ class TestComponent(WarpEventLoopTestCase):
     def test_sensors(self):
         assert self.comp._sensors == ['pressure', 'speed', 'temperature']
 
+    def test_sensors_cache(self):
+        assert self.comp._sensors == ['pressure', 'speed', 'temperature']
+        # The sensors are only worked out once while the attributes stay the same
+        cache = self.comp.__dict__['_sensors_cache']
+        assert self.comp._sensors == ['pressure', 'speed', 'temperature']
+        assert self.comp.__dict__['_sensors_cache'] is cache
+        # Adding an attribute invalidates the cache
+        self.comp.humidity = 20.0
+        assert self.comp._sensors == ['humidity', 'pressure', 'speed', 'temperature']
+        # So does replacing one attribute by another
+        del self.comp.humidity
+        self.comp.wind_speed = 5.0
+        assert self.comp._sensors == ['pressure', 'speed', 'temperature', 'wind_speed']
+        # Callables are not sensors, and new class methods are picked up
+        assert 'capture_start' in self.comp._api_methods()
+        self.comp._add_dummy_methods('capture_init')
+        assert 'capture_init' in self.comp._api_methods()
+        assert 'capture_init' not in self.comp._sensors
+
     async def test_dummy_methods(self):
         # Just tests that it exists and runs without crashing
         await self.comp.capture_stop()
@@ -117,6 +139,93 @@ class TestTelstateUpdatingComponent(WarpEventLoopTestCase):
              (1004.0, self.START_TIME + 1.0),
              (1006.0, self.START_TIME + 1.5)]
 
+    async def test_rate_policies(self):
+        """Test deadband and event-only rate policies."""
+        self.comp._set_rate_policies({'temperature': RatePolicy(deadband=0.5),
+                                      'pos_*': RatePolicy(event=True)})
+        for value in [451.0, 451.2, 451.6, 451.8, 452.2]:
+            get_clock().advance(1.0)
+            self.comp.temperature = value
+        for value in [1000.0, 1000.0, 1001.0, 1001.0]:
+            get_clock().advance(1.0)
+            self.comp.pos_foo = value
+        await self.comp._flush()
+        # The first value after the policy change is always sent
+        assert await self.telstate.get_range('dummy_temperature', st=0) == \
+            [(451.0, self.START_TIME - 300.0),
+             (451.0, self.START_TIME + 1.0),
+             (451.6, self.START_TIME + 3.0),
+             (452.2, self.START_TIME + 5.0)]
+        # The pos_foo sensor is no longer limited to SENSOR_MIN_PERIOD
+        assert await self.telstate.get_range('dummy_pos_foo', st=0) == \
+            [(1000.0, self.START_TIME - 300.0),
+             (1000.0, self.START_TIME + 6.0),
+             (1001.0, self.START_TIME + 8.0)]
+
+    async def test_restart_with_rate_policies(self):
+        """Rate-limited sensors are sent to the new telstate after a restart"""
+        self.comp._set_rate_policies({'temperature': RatePolicy(deadband=0.5),
+                                      'pos_*': RatePolicy(period=10.0, event=True)})
+        get_clock().advance(1.0)
+        self.comp._update(get_clock().time())
+        self.comp.temperature = 451.0
+        self.comp.pos_foo = 1000.0
+        await self.comp._stop()
+        telstate = katsdptelstate.aio.TelescopeState()
+        self.comp._telstate = telstate
+        get_clock().advance(1.0)
+        self.comp._update(get_clock().time())
+        await self.comp._start()
+        await self.comp._flush()
+        assert await telstate.get('dummy_temperature') == 451.0
+        assert await telstate.get('dummy_pos_foo') == 1000.0
+
+    async def test_dedupe_second_session(self):
+        """A new session gets all sensor values, even if they are deduplicated"""
+        self.comp._writer.dedupe = True
+        get_clock().advance(1)
+        self.comp.temperature = 451.0
+        await self.comp._stop()
+        telstate = katsdptelstate.aio.TelescopeState()
+        self.comp._telstate = telstate
+        await self.comp._start()
+        await self.comp._flush()
+        assert await telstate.get('dummy_temperature') == 451.0
+
+    async def test_batched_writes(self):
+        """Updates made in one go are sent to telstate as a single batch"""
+        await self.comp._flush()
+        stats = self.comp._writer.stats
+        # The speed sensor is immutable and is sent individually by _start
+        assert stats.individual_writes == 1
+        batches, batched_writes = stats.batches, stats.batched_writes
+        get_clock().advance(1)
+        self.comp.temperature = 100.0
+        self.comp.temperature = 101.0
+        self.comp.pos_foo = 1.0
+        await self.comp._flush()
+        assert stats.batches == batches + 1
+        assert stats.batched_writes == batched_writes + 3
+        assert await self.telstate.get('dummy_temperature') == 101.0
+
+    async def test_max_pending(self):
+        """Sensor updates beyond the writer's queue bound are dropped"""
+        await self.comp._flush()
+        self.comp._writer.max_pending = 2
+        for n in range(5):
+            get_clock().advance(1)
+            self.comp.temperature = 100.0 + n
+        assert self.comp._writer.depth == 2
+        assert self.comp._writer.stats.dropped_writes == 3
+        await self.comp._flush()
+        # There is room again once the queued updates have been sent
+        get_clock().advance(1)
+        self.comp.temperature = 200.0
+        await self.comp._flush()
+        assert await self.telstate.get_range('dummy_temperature', st=self.START_TIME) == \
+            [(100.0, self.START_TIME + 1.0), (101.0, self.START_TIME + 2.0),
+             (200.0, self.START_TIME + 6.0)]
+
     def test_updatable(self):
         assert self.comp._updatable
 
@@ -183,6 +292,7 @@ class TestKATCPComponent:
         assert response == ([b'hello'], [])
         await comp._stop()
         await comp._stop()       # Check that it's idempotent
+        await katcp_pool().close()
         await task
 
 
@@ -225,3 +335,115 @@ class TestMultiMethod:
         await mm('a', 1, kw=2)
         assert self.async1.called_with == (('a', 1), {'kw': 2})
         assert self.async2.called_with == (('a', 1), {'kw': 2})
+
+    async def test_latencies(self):
+        mm = MultiMethod([self.sync1, self.async1], 'my_method', 'help')
+        assert mm.slowest() is None
+        await mm()
+        assert set(mm.latencies) == {'0', '1'}
+        assert mm.slowest()[1] >= 0.0
+
+
+class SlowMethod:
+    def __init__(self, name, delay):
+        self._name = name
+        self.delay = delay
+
+    async def my_method(self):
+        await asyncio.sleep(self.delay)
+        return self._name
+
+
+class TestMultiMethodOptions(WarpEventLoopTestCase):
+    def setup_method(self):
+        self.objects = [SlowMethod('fast', 1.0), SlowMethod('slow', 100.0),
+                        SlowMethod('medium', 2.0)]
+
+    async def test_max_in_flight(self):
+        mm = MultiMethod(self.objects[::2] * 2, 'my_method', 'help', max_in_flight=2)
+        start = get_clock().time()
+        assert await mm() == ['fast', 'medium', 'fast', 'medium']
+        # Only two at a time, so the second pair has to wait for the first
+        assert get_clock().time() - start == 4.0
+
+    async def test_timeout(self):
+        mm = MultiMethod(self.objects, 'my_method', 'help', timeout=10.0)
+        with pytest.raises(asyncio.TimeoutError, match='slow.my_method'):
+            await mm()
+
+    async def test_partial(self):
+        mm = MultiMethod(self.objects, 'my_method', 'help', timeout=10.0, partial=True)
+        results = await mm()
+        assert results[0] == 'fast'
+        assert isinstance(results[1], asyncio.TimeoutError)
+        assert results[2] == 'medium'
+
+
+class SlowStarter(Component):
+    def __init__(self, name, delay, start_after=(), fail=False):
+        super().__init__()
+        self._name = name
+        self._delay = delay
+        self._start_after = start_after
+        self._fail = fail
+        self._start_time = None
+
+    async def _start(self):
+        self._start_time = get_clock().time()
+        await asyncio.sleep(self._delay)
+        if self._fail:
+            raise RuntimeError(f'{self._name} failed')
+        await super()._start()
+
+
+class TestStartComponents(WarpEventLoopTestCase):
+    async def test_concurrent(self):
+        comps = [SlowStarter('sub', 2.0), SlowStarter('anc', 3.0),
+                 SlowStarter('cbf', 1.0, start_after=['sub', 'missing'])]
+        start = get_clock().time()
+        await start_components(comps)
+        assert all(comp._started for comp in comps)
+        assert comps[1]._start_time == start
+        assert comps[2]._start_time == start + 2.0
+        assert get_clock().time() - start == 3.0
+
+    async def test_group(self):
+        ants = MultiComponent('ants', [SlowStarter('m000', 1.0, start_after=['sub']),
+                                       SlowStarter('m001', 1.0)])
+        assert ants._start_after == ['sub']
+        start = get_clock().time()
+        phases = []
+
+        @contextlib.contextmanager
+        def phase(name):
+            yield
+            phases.append(name)
+
+        await start_components([ants, SlowStarter('sub', 2.0)], phase)
+        assert ants.m001._start_time == start + 2.0
+        assert phases == ['start sub', 'start ants']
+
+    async def test_failure(self):
+        comps = [SlowStarter('sub', 1.0, fail=True), SlowStarter('anc', 10.0),
+                 SlowStarter('cbf', 1.0, start_after=['sub'])]
+        with pytest.raises(RuntimeError, match='sub failed'):
+            await start_components(comps)
+        assert not any(comp._started for comp in comps)
+        assert comps[2]._start_time is None
+
+    async def test_group_failure(self):
+        # Fan-out options only apply to public methods, not to starting up
+        ants = MultiComponent('ants', [SlowStarter('m000', 1.0, fail=True),
+                                       SlowStarter('m001', 100.0)], timeout=10.0, partial=True)
+        assert not ants._start.partial and ants._start.timeout is None
+        start = get_clock().time()
+        with pytest.raises(RuntimeError, match='m000 failed'):
+            await start_components([ants])
+        assert get_clock().time() - start == 1.0
+
+    async def test_cycle(self):
+        comps = [SlowStarter('a', 1.0, start_after=['b']), SlowStarter('b', 1.0, start_after=['a']),
+                 SlowStarter('c', 1.0)]
+        with pytest.raises(ValueError, match='a, b'):
+            await start_components(comps)
+        assert comps[2]._start_time is None
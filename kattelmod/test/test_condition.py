@@ -0,0 +1,50 @@
+import pytest
+
+from kattelmod.component import TelstateUpdatingComponent, MultiComponent
+from kattelmod.condition import SensorTally, AllEqual, AnyEqual
+
+
+class DummyComponent(TelstateUpdatingComponent):
+    def __init__(self) -> None:
+        super().__init__()
+        self.activity = 'stop'
+
+
+class TestSensorTally:
+    def setup_method(self) -> None:
+        self.comps = [DummyComponent() for n in range(3)]
+        for n, comp in enumerate(self.comps):
+            comp._name = f'ant{n + 1}'
+        self.ants = MultiComponent('ants', self.comps)
+
+    def test_all_equal(self) -> None:
+        with AllEqual(self.ants, 'activity', 'track') as on_target:
+            assert on_target.count == 0
+            assert not on_target()
+            self.ants.activity = 'track'
+            assert on_target.count == 3
+            assert on_target()
+            self.comps[1].activity = 'slew'
+            assert not on_target()
+            # Setting the same value again does not count twice
+            self.comps[1].activity = 'slew'
+            self.comps[1].activity = 'track'
+            assert on_target.count == 3
+        assert all(not comp._watchers for comp in self.comps)
+
+    def test_any_equal(self) -> None:
+        with AnyEqual(self.comps + self.comps, 'activity', 'slew') as slewing:
+            assert len(slewing.components) == 3
+            assert not slewing()
+            self.comps[2].activity = 'slew'
+            assert slewing()
+            assert slewing.count == 1
+            assert slewing.depends == [(comp, 'activity') for comp in self.comps]
+
+    def test_empty(self) -> None:
+        assert AllEqual([], 'activity', 'track')()
+        assert not AnyEqual([], 'activity', 'track')()
+
+    def test_abstract(self) -> None:
+        with pytest.raises(TypeError):
+            SensorTally(self.comps, 'activity', 'track')
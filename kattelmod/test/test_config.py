@@ -0,0 +1,99 @@
+import io
+import json
+import re
+
+import pytest
+
+from kattelmod import config
+from kattelmod.component import RatePolicy
+
+
+CONFIG = """\
+[Telescope mkat]
+ants* = fake.AntennaPositioner
+cbf = fake.CorrelatorBeamformer
+
+[ants]
+names = m000,m001
+rate.pos_* = {"period": 1.0}
+
+[cbf]
+update_period = 2.0
+start_after = ["ants"]
+"""
+
+
+@pytest.fixture
+def cache(config_cache):
+    return config_cache
+
+
+def test_compile_config() -> None:
+    compiled = config.compile_config(CONFIG)
+    assert compiled['system'] == 'mkat'
+    ants, cbf = compiled['components']
+    assert ants['group'] and not cbf['group']
+    assert [member['name'] for member in ants['members']] == ['m000', 'm001']
+    assert ants['members'][0]['type'] == 'mkat.fake.AntennaPositioner'
+    assert ants['members'][0]['params']['observer'].startswith('m000,')
+    assert ants['members'][1]['rate_policies'] == {
+        'pos_*': {'period': 1.0, 'deadband': 0.0, 'event': False}}
+    assert cbf['members'][0]['update_period'] == 2.0
+    # Compiled configs survive the trip to disk
+    assert json.loads(json.dumps(compiled)) == compiled
+
+
+def test_cached_params_not_shared(monkeypatch) -> None:
+    compiled = config.load_compiled_config(io.StringIO(CONFIG))
+    assert config.load_compiled_config(io.StringIO(CONFIG)) is compiled
+    construct_component = config.construct_component
+
+    def construct_and_modify(comp_type, name, params):
+        comp = construct_component(comp_type, name, params)
+        params.clear()
+        return comp
+
+    monkeypatch.setattr(config, 'construct_component', construct_and_modify)
+    config.session_from_config(io.StringIO(CONFIG))
+    assert compiled['components'][0]['members'][0]['params']['observer'].startswith('m000,')
+
+
+def test_session_from_cache(cache, monkeypatch) -> None:
+    session = config.session_from_config(io.StringIO(CONFIG))
+    assert [ant._name for ant in session.ants] == ['m000', 'm001']
+    assert len(list(cache.glob('*.json'))) == 1
+    # A fresh process only has the disk cache, and skips compiling the config
+    config._config_cache.clear()
+    monkeypatch.setattr(config, 'compile_config', None)
+    session = config.session_from_config(io.StringIO(CONFIG))
+    assert session.ants.m001.observer.name == 'm001'
+    assert session.ants.m001._rate_policies['pos_*'] == RatePolicy(period=1.0)
+    assert session.cbf._update_period == 2.0
+    assert session.cbf._start_after == ['ants']
+
+
+def test_stale_cache(cache) -> None:
+    config.session_from_config(io.StringIO(CONFIG))
+    cache_file, = cache.glob('*.json')
+    compiled = json.loads(cache_file.read_text())
+    compiled['antennas_digest'] = 'outdated'
+    cache_file.write_text(json.dumps(compiled))
+    config._config_cache.clear()
+    assert config.load_compiled_config(io.StringIO(CONFIG))['antennas_digest'] != 'outdated'
+
+
+def test_warm_config_cache(cache) -> None:
+    keys = config.warm_config_cache(['mkat/fake_2ant.cfg'])
+    assert [path.stem for path in cache.glob('*.json')] == keys
+    assert config.main(['warm']) == 0
+    assert len(list(cache.glob('*.json'))) > 1
+
+
+def test_errors_name_config_file(tmp_path) -> None:
+    config_file = tmp_path / 'broken.cfg'
+    config_file.write_text("[ants]\nnames = m000\n")
+    with pytest.raises(config.Error, match=re.escape(f"Config file '{config_file}': No Telescope section")):
+        config.session_from_config(str(config_file), use_cache=False)
+    config_file.write_text(CONFIG.replace('mkat', 'unknown'))
+    with pytest.raises(config.Error, match=re.escape(f"Config file '{config_file}': Unknown telescope")):
+        config.load_compiled_config(str(config_file))
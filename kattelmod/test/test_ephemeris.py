@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+from katpoint import Antenna, Target, construct_azel_target, wrap_angle
+
+from kattelmod import ephemeris
+from kattelmod.ephemeris import EphemerisTable
+
+
+ANT1 = 'm062, -30:42:39.8, 21:26:38.0, 1035.0, 13.5, -1440.6285 -2503.7779 -3.9, , 1.22'
+START_TIME = 1456395240.0
+
+
+def _max_error(table, times):
+    """Largest angular difference between table and direct calculation."""
+    table_az, table_el = np.array([table.azel(t) for t in times]).T
+    az, el = table.target.azel(times, table.antenna)
+    return max(np.max(np.abs(wrap_angle(table_az - az)) * np.cos(el)),
+               np.max(np.abs(table_el - el)))
+
+
+@pytest.mark.parametrize('description', ['J1939-6342, radec, 19:39:25.03, -63:42:45.6',
+                                         'Moon, special', 'azel, 10, 20'])
+def test_accuracy(description) -> None:
+    table = EphemerisTable(Target(description), Antenna(ANT1))
+    times = START_TIME + np.arange(0.0, 300.0, 3.7)
+    assert _max_error(table, times) <= table.tolerance
+    assert table.max_error <= table.tolerance
+
+
+def test_refine_near_zenith() -> None:
+    antenna = Antenna(ANT1)
+    transit = START_TIME + 30.0
+    ra, dec = construct_azel_target(0.0, np.radians(89.99)).radec(transit, antenna)
+    target = Target(f'zenith, radec, {ra}, {dec}')
+    table = EphemerisTable(target, antenna)
+    times = transit + np.arange(-20.0, 20.0, 0.3)
+    assert _max_error(table, times) <= table.tolerance
+    start, step, az, el = table._chunks[int(transit // table.span)]
+    assert step < 0.5 * table.step
+
+
+def test_direct_fallback() -> None:
+    table = EphemerisTable(Target('Moon, special'), Antenna(ANT1), tolerance=0.0)
+    times = START_TIME + np.arange(0.0, 10.0, 1.1)
+    assert _max_error(table, times) == pytest.approx(0.0, abs=1e-10)
+    assert list(table._chunks.values()) == [None]
+
+
+def test_chunks_evicted(monkeypatch) -> None:
+    monkeypatch.setattr(ephemeris, 'MAX_EPHEMERIS_CHUNKS', 2)
+    table = EphemerisTable(Target('azel, 10, 20'), Antenna(ANT1), span=10.0)
+    for offset in (0.0, 10.0, 20.0, 5.0):
+        table.azel(START_TIME + offset)
+    assert len(table._chunks) == 2
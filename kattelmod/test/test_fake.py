@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from kattelmod.component import MultiComponent
+from kattelmod.systems.mkat.fake import AntennaPositioner, AntennaPositionerGroup
+
+
+ANT1 = 'm062, -30:42:39.8, 21:26:38.0, 1035.0, 13.5, -1440.6285 -2503.7779 -3.9, , 1.22'
+ANT2 = 'm063, -30:42:39.8, 21:26:38.0, 1035.0, 13.5, -3419.5827 -1840.4801 16.3, , 1.22'
+START_TIME = 1234567890.0
+
+
+def _run(positioners, start, end, step=0.1):
+    """Update `positioners` every `step` seconds from `start` to `end` seconds."""
+    for offset in np.arange(start, end + 0.5 * step, step):
+        for ant in positioners:
+            ant._update(START_TIME + offset)
+
+
+def _point(positioners, target):
+    for ant in positioners:
+        ant.target = target
+        ant.activity = 'slew'
+
+
+class TestAntennaPositionerGroup:
+    def setup_method(self):
+        self.ant1 = AntennaPositioner(ANT1)
+        self.ant1._name = 'm062'
+        self.ant2 = AntennaPositioner(ANT2)
+        self.ant2._name = 'm063'
+        self.ants = [self.ant1, self.ant2]
+
+    def test_multicomponent_engine(self):
+        ants = MultiComponent('ants', self.ants)
+        assert isinstance(ants._engine, AntennaPositionerGroup)
+        assert self.ant1._group is ants._engine
+        assert self.ant2._group is ants._engine
+        assert self.ant2._group_index == 1
+
+    def test_regroup_keeps_position(self):
+        self.ant2.pos_actual_scan_azim = 45.0
+        self.ant2.pos_actual_scan_elev = 60.0
+        MultiComponent('ants', self.ants)
+        assert self.ant2.pos_actual_scan_azim == 45.0
+        assert self.ant2.pos_actual_scan_elev == 60.0
+        assert self.ant1.pos_actual_scan_elev == 90.0
+
+    def test_slew_and_lock(self):
+        MultiComponent('ants', self.ants)
+        _point(self.ants, 'azel, 20, 70')
+        _run(self.ants, 0.0, 10.0)
+        # Elevation slews at 1 deg/s from the zenith, so not there yet
+        for ant in self.ants:
+            assert ant.activity == 'slew'
+            assert ant.pos_actual_scan_elev == pytest.approx(80.0)
+            assert ant.pos_actual_scan_azim == pytest.approx(20.0)
+        _run(self.ants, 10.1, 25.0)
+        for ant in self.ants:
+            assert ant.activity == 'track'
+            assert ant.pos_actual_scan_elev == pytest.approx(70.0)
+            assert ant.pos_request_scan_azim == pytest.approx(20.0)
+
+    def test_group_matches_individual(self):
+        solo = AntennaPositioner(ANT2)
+        MultiComponent('ants', self.ants)
+        _point(self.ants + [solo], 'Sun, special')
+        _run(self.ants, 0.0, 30.0)
+        _run([solo], 0.0, 30.0)
+        assert self.ant2.pos_actual_scan_azim == pytest.approx(solo.pos_actual_scan_azim)
+        assert self.ant2.pos_actual_scan_elev == pytest.approx(solo.pos_actual_scan_elev)
+        assert self.ant2.activity == solo.activity
+
+    def test_limits(self):
+        MultiComponent('ants', self.ants)
+        _point(self.ants, 'azel, 20, 5')
+        _run(self.ants, 0.0, 100.0)
+        for ant in self.ants:
+            assert ant.pos_actual_scan_elev == pytest.approx(15.0)
+            assert ant.activity == 'slew'
+
+    def test_bulk_target(self):
+        ants = MultiComponent('ants', self.ants)
+        ants.target = 'Sun, special'
+        assert self.ant1.target == self.ant2.target == 'Sun, special'
+        assert self.ant1.target is not self.ant2.target
+        assert self.ant1.target.antenna is self.ant1.observer
+        assert self.ant2.target.antenna is self.ant2.observer
+        ants._set_values('target', ['azel, 10, 20', ''])
+        assert self.ant1.target.azel() == pytest.approx((np.radians(10), np.radians(20)))
+        assert self.ant2.target == ''
+        with pytest.raises(ValueError):
+            ants._set_values('target', ['azel, 10, 20'])
+
+    def test_bulk_parameters(self):
+        ants = MultiComponent('ants', self.ants)
+        ants.max_slew_azim_dps = 4.0
+        ants._set_values('real_el_min_deg', [20.0, 25.0])
+        assert self.ant1.max_slew_azim_dps == self.ant2.max_slew_azim_dps == 4.0
+        assert self.ant2.real_el_min_deg == 25.0
+        # The group engine got the whole array of values in one go
+        group = self.ant1._group
+        assert group.max_slew_az.tolist() == [4.0, 4.0]
+        assert group.el_min.tolist() == [20.0, 25.0]
+
+    def test_predict_lock(self):
+        MultiComponent('ants', self.ants)
+        # The Moon is up and moving at the start time
+        _point(self.ants, 'Moon, special')
+        _run(self.ants, 0.0, 0.0)
+        predicted = [ant._next_event() for ant in self.ants]
+        locked = {}
+        for offset in np.arange(0.01, 60.0, 0.01):
+            _run(self.ants, offset, offset)
+            for ant in self.ants:
+                if ant.activity == 'track':
+                    locked.setdefault(ant, START_TIME + offset)
+        for ant, lock_time in zip(self.ants, predicted):
+            assert 10.0 < lock_time - START_TIME < 60.0
+            assert locked[ant] == pytest.approx(lock_time, abs=0.02)
+
+    def test_predict_unreachable(self):
+        MultiComponent('ants', self.ants)
+        _point(self.ants, 'azel, 20, 5')
+        _run(self.ants, 0.0, 0.0)
+        assert self.ant1._next_event() == np.inf
+        self.ant2.activity = 'track'
+        assert self.ant2._next_event() == np.inf
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import threading
+
+import katsdptelstate.aio
+
+from kattelmod.logger import BatchedDeliveryHandler, configure_logging
+from kattelmod.systems.mkat.fake import Observation
+from kattelmod.test.test_clock import WarpEventLoopTestCase
+
+
+def _record(msg: str, created: float) -> logging.LogRecord:
+    record = logging.LogRecord('test', logging.INFO, __file__, 1, msg, (), None)
+    record.created = created
+    return record
+
+
+class FixedClock:
+    def time(self) -> float:
+        return 1234567890.25
+
+
+def test_custom_clock(caplog) -> None:
+    configure_logging(logging.INFO, clock=FixedClock())
+    try:
+        with caplog.at_level(logging.INFO, logger='test'):
+            logging.getLogger('test').info('tick')
+    finally:
+        configure_logging(logging.WARNING)
+    record, = caplog.records
+    assert record.created == 1234567890.25
+    assert record.msecs == 250.0
+
+
+class TestBatchedDeliveryHandler:
+    def setup_method(self) -> None:
+        self.batches = []
+
+    def deliver(self, messages) -> None:
+        self.batches.append(messages)
+
+    def test_immediate_without_loop(self) -> None:
+        handler = BatchedDeliveryHandler(self.deliver)
+        handler.handle(_record('first', 1.0))
+        handler.handle(_record('second', 2.0))
+        assert self.batches == [[(1.0, 'first')], [(2.0, 'second')]]
+
+    async def test_batched_on_loop(self) -> None:
+        handler = BatchedDeliveryHandler(self.deliver, asyncio.get_running_loop())
+        for n in range(5):
+            handler.handle(_record(f'msg {n}', float(n)))
+        # Nothing is delivered from within the logging call
+        assert self.batches == []
+        await asyncio.sleep(0)
+        assert self.batches == [[(float(n), f'msg {n}') for n in range(5)]]
+        handler.handle(_record('later', 5.0))
+        await asyncio.sleep(0)
+        assert self.batches[1] == [(5.0, 'later')]
+
+    async def test_overflow(self) -> None:
+        handler = BatchedDeliveryHandler(self.deliver, asyncio.get_running_loop(), capacity=2)
+        for n in range(5):
+            handler.handle(_record(f'msg {n}', float(n)))
+        assert handler.dropped == 3
+        handler.flush()
+        assert self.batches == [[(0.0, 'msg 0'), (1.0, 'msg 1'),
+                                 (1.0, '[3 log message(s) dropped]')]]
+        # The drop is only reported once but still counted
+        await asyncio.sleep(0)
+        assert len(self.batches) == 1
+        assert handler.dropped == 3
+
+    def test_no_recursion(self) -> None:
+        handler = BatchedDeliveryHandler(None)
+
+        def deliver(messages):
+            self.batches.append(messages)
+            handler.handle(_record('delivery failed', 2.0))
+
+        handler.deliver = deliver
+        handler.handle(_record('msg', 1.0))
+        assert self.batches == [[(1.0, 'msg')]]
+        # The delivery's own records are skipped, not reported as dropped
+        assert handler.dropped == 0
+        handler.handle(_record('next', 3.0))
+        assert self.batches[1] == [(3.0, 'next')]
+
+    async def test_format_on_emit(self) -> None:
+        handler = BatchedDeliveryHandler(self.deliver, asyncio.get_running_loop())
+        values = [1]
+        record = logging.LogRecord('test', logging.INFO, __file__, 1, 'values %s', (values,), None)
+        record.created = 1.0
+        handler.handle(record)
+        values.append(2)
+        await asyncio.sleep(0)
+        assert self.batches == [[(1.0, 'values [1]')]]
+
+    async def test_other_threads_during_delivery(self) -> None:
+        handler = BatchedDeliveryHandler(None, asyncio.get_running_loop())
+
+        def deliver(messages):
+            self.batches.append(messages)
+            if len(self.batches) == 1:
+                thread = threading.Thread(target=handler.handle, args=(_record('other', 2.0),))
+                thread.start()
+                thread.join()
+
+        handler.deliver = deliver
+        handler.handle(_record('msg', 1.0))
+        await asyncio.sleep(0)
+        await asyncio.sleep(0)
+        assert self.batches == [[(1.0, 'msg')], [(2.0, 'other')]]
+        assert handler.dropped == 0
+
+    def test_stopped_loop(self) -> None:
+        loop = asyncio.new_event_loop()
+        handler = BatchedDeliveryHandler(self.deliver, loop)
+
+        def log_and_stop():
+            handler.handle(_record('first', 1.0))
+            loop.stop()
+
+        # The scheduled flush never runs, since the loop stops first
+        loop.call_soon(log_and_stop)
+        loop.run_forever()
+        loop.close()
+        assert self.batches == []
+        handler.handle(_record('second', 2.0))
+        assert self.batches == [[(1.0, 'first'), (2.0, 'second')]]
+
+    def test_close(self) -> None:
+        loop = asyncio.new_event_loop()
+        handler = BatchedDeliveryHandler(self.deliver, loop)
+        loop.call_soon(lambda: (handler.handle(_record('first', 1.0)), loop.stop()))
+        loop.run_forever()
+        loop.close()
+        handler.close()
+        assert self.batches == [[(1.0, 'first')]]
+        assert not handler._flush_scheduled
+
+
+class TestScriptLogViaTelstate(WarpEventLoopTestCase):
+    async def test_debug_delivery(self) -> None:
+        """Telstate debug lines of the delivery itself are not reported as dropped"""
+        obs = Observation()
+        obs._name = 'obs'
+        obs._telstate = katsdptelstate.aio.TelescopeState()
+        await obs._start()
+
+        def deliver(messages):
+            for timestamp, msg in messages:
+                obs._update_time = timestamp
+                obs.script_log = msg
+
+        handler = BatchedDeliveryHandler(deliver, asyncio.get_running_loop())
+        handler.setFormatter(logging.Formatter('%(message)s'))
+        logger = logging.getLogger('kattelmod.component')
+        old_level = logger.level
+        logger.setLevel(logging.DEBUG)
+        logger.addHandler(handler)
+        try:
+            for n in range(3):
+                logger.debug('msg %d', n)
+                await asyncio.sleep(0)
+        finally:
+            logger.removeHandler(handler)
+            logger.setLevel(old_level)
+        await obs._flush()
+        messages = [value for value, _ in await obs._telstate.get_range('obs_script_log', st=0)]
+        assert messages[-3:] == ['msg 0', 'msg 1', 'msg 2']
+        assert not any('dropped' in message for message in messages)
+        assert handler.dropped == 0
@@ -0,0 +1,101 @@
+import asyncio
+from unittest import mock
+
+import aiokatcp
+import async_solipsism
+import pytest
+
+from kattelmod.component import KATCPComponent
+from kattelmod.pool import KATCPPool
+
+
+class DummyServer(aiokatcp.DeviceServer):
+    VERSION = 'dummy-1.0'
+    BUILD_STATE = 'dummy-1.0.0'
+
+
+class TestKATCPPool:
+    @classmethod
+    @pytest.fixture
+    def event_loop(cls):
+        loop = async_solipsism.EventLoop()
+        yield loop
+        loop.close()
+
+    @pytest.fixture(autouse=True)
+    async def setup_method(self) -> None:
+        self.server = DummyServer('127.0.0.1', 7147)
+        await self.server.start()
+        self.pool = KATCPPool(max_idle=1)
+        yield
+        await self.pool.close()
+        await self.server.stop()
+
+    async def test_reuse(self):
+        client = await self.pool.acquire('127.0.0.1', 7147)
+        await self.pool.release(client)
+        assert await self.pool.acquire('127.0.0.1', 7147) is client
+        # Another client is needed while the first one is borrowed
+        other = await self.pool.acquire('127.0.0.1', 7147)
+        assert other is not client
+        assert (self.pool.connects, self.pool.reuses) == (2, 1)
+        await self.pool.release(client)
+        # Only one client is kept idle, so the other one is closed
+        await self.pool.release(other)
+        assert not other.is_connected
+        assert await self.pool.acquire('127.0.0.1', 7147) is client
+
+    async def test_no_reuse(self):
+        client = await self.pool.acquire('127.0.0.1', 7147)
+        await self.pool.release(client, reuse=False)
+        assert not client.is_connected
+        assert self.pool.n_idle == 0
+
+    async def test_max_idle_total(self):
+        self.pool.max_idle = 2
+        self.pool.max_idle_total = 1
+        clients = [await self.pool.acquire('127.0.0.1', 7147) for _ in range(2)]
+        for client in clients:
+            await self.pool.release(client)
+        assert self.pool.n_idle == 1
+        assert not clients[1].is_connected
+
+    async def test_closed_loop(self):
+        loop = asyncio.new_event_loop()
+        loop.close()
+        client = mock.Mock()
+        key = (loop, '127.0.0.1', 7147)
+        self.pool._idle[key] = [client]
+        self.pool._keys[client] = key
+        await self.pool.release(await self.pool.acquire('127.0.0.1', 7147))
+        client.close.assert_called_once_with()
+        assert key not in self.pool._idle and client not in self.pool._keys
+
+    async def test_reconnect(self):
+        client = await self.pool.acquire('127.0.0.1', 7147)
+        await self.pool.release(client)
+        # The health check spots the broken connection and replaces it
+        await self.server.stop()
+        await asyncio.sleep(0.1)
+        await self.server.start()
+        new_client = await self.pool.acquire('127.0.0.1', 7147)
+        assert new_client is not client
+        assert new_client.is_connected
+        assert self.pool.connects == 2
+
+    async def test_component(self, monkeypatch):
+        monkeypatch.setattr('kattelmod.component.katcp_pool', lambda: self.pool)
+        for _ in range(2):
+            comp = KATCPComponent('127.0.0.1:7147')
+            await comp._start()
+            await comp._client.request('watchdog')
+            await comp._stop()
+            assert comp._client is None
+        assert (self.pool.connects, self.pool.reuses) == (1, 1)
+        # Unpooled components close their connections when they stop
+        comp = KATCPComponent('127.0.0.1:7147', pooled=False)
+        await comp._start()
+        client = comp._client
+        await comp._stop()
+        assert not client.is_connected
+        assert self.pool.reuses == 2
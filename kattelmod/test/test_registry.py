@@ -0,0 +1,80 @@
+from katpoint import Antenna
+
+from kattelmod import registry
+from kattelmod.registry import get_antenna, get_target, system_antennas
+from kattelmod.systems.mkat.fake import AntennaPositioner
+
+
+ANT1 = 'm062, -30:42:39.8, 21:26:38.0, 1035.0, 13.5, -1440.6285 -2503.7779 -3.9, , 1.22'
+ANT2 = 'm063, -30:42:39.8, 21:26:38.0, 1035.0, 13.5, -3419.5827 -1840.4801 16.3, , 1.22'
+TARGET = 'J1939-6342, radec, 19:39:25.03, -63:42:45.6'
+
+
+def test_get_antenna() -> None:
+    antenna = get_antenna(ANT1)
+    assert antenna.name == 'm062'
+    assert get_antenna(ANT1) is antenna
+    assert get_antenna(antenna) is antenna
+    other = Antenna(ANT1)
+    assert get_antenna(other) is other
+
+
+def test_system_antennas() -> None:
+    antennas = system_antennas('mkat')
+    assert antennas['m000'].startswith('m000,')
+    assert system_antennas('mkat') is antennas
+
+
+def test_lazy_observer() -> None:
+    ant1, ant2 = AntennaPositioner(ANT1), AntennaPositioner(ANT1)
+    # The observer is kept as a string until it is used
+    assert ant1._observer == ANT1
+    assert isinstance(ant1.observer, Antenna)
+    assert ant1.observer is ant2.observer
+    ant1.target = 'Sun, special'
+    assert ant1.target.antenna is ant1.observer
+
+
+def test_get_target() -> None:
+    target = get_target(TARGET)
+    assert target.antenna is None
+    target1, target2 = get_target(TARGET, ANT1), get_target(TARGET, get_antenna(ANT2))
+    assert target1.antenna is get_antenna(ANT1)
+    assert target2.antenna is get_antenna(ANT2)
+    assert target1 == target2 == target == get_target(TARGET, ANT1)
+    assert get_target(TARGET, ANT1) is not target1
+    # Targets are only copied if they need a different antenna
+    assert get_target(target1, ANT1) is target1
+    target3 = get_target(target1, ANT2)
+    assert target3 is not target1 and target3.antenna is get_antenna(ANT2)
+    assert target1.antenna is get_antenna(ANT1)
+
+
+def test_modified_target_not_shared() -> None:
+    target = get_target(TARGET, ANT1)
+    target.tags.append('gaincal')
+    target.aliases.append('alias')
+    target.flux_model = None
+    target.antenna = get_antenna(ANT2)
+    fresh = get_target(TARGET, ANT1)
+    assert fresh.description == TARGET
+    assert fresh.antenna is get_antenna(ANT1)
+
+
+def test_target_cache_size(monkeypatch) -> None:
+    monkeypatch.setattr(registry, 'TARGET_CACHE_SIZE', 2)
+    monkeypatch.setattr(registry, '_targets', {})
+    get_target(TARGET, ANT1)
+    # The oldest targets make way for new ones
+    get_target('Sun, special')
+    get_target('Moon, special')
+    assert list(registry._targets) == ['Sun, special', 'Moon, special']
+
+
+def test_observer_change_keeps_other_target() -> None:
+    ant1, ant2 = AntennaPositioner(ANT1), AntennaPositioner(ANT1)
+    ant1.target = ant2.target = TARGET
+    assert ant1.target == ant2.target
+    ant1.observer = ANT2
+    assert ant1.target.antenna is get_antenna(ANT2)
+    assert ant2.target.antenna is get_antenna(ANT1)
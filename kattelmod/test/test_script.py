@@ -10,9 +10,17 @@ testpath = os.path.dirname(kattelmod.test.__file__)
 
 
 def test_run_script():
+    _run_script('--dry-run')
+
+
+def test_run_script_fast_forward():
+    _run_script('--dry-run', '--fast-forward')
+
+
+def _run_script(*options):
     script = os.path.join(testpath, 'basic_track.py')
     target = 'Sun, special'
-    cmd = ['python3', script, target, '--dry-run',
+    cmd = ['python3', script, target, *options,
             '--start-time=2016-02-25 10:14:00']
     process = subprocess.run(cmd, capture_output=True)
     print(process.stdout)
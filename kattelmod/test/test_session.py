@@ -1,5 +1,10 @@
+import asyncio
+import json
+import sys
+
 import katpoint
 import pytest
+from katsdptelstate.aio.redis import RedisBackend
 
 import kattelmod
 from kattelmod.component import TelstateUpdatingComponent
@@ -15,7 +20,8 @@ ARGS = [
 
 
 @pytest.fixture
-def session():
+def session(config_cache):
+    # The event loop fixture needs the session, and may come before autouse fixtures
     return kattelmod.session_from_commandline(targets=True, args=ARGS)
 
 
@@ -55,3 +61,62 @@ async def test_session(session, args):
         await session.track(target, duration=10)
         assert await _telstate_get(session, 'obs_activity') == 'track'
     assert session.state == CaptureState.UNCONFIGURED
+
+
+async def test_script_log(session, args):
+    async with await session.connect(args):
+        await session.track(session.targets.targets[0], duration=10)
+        # Let the script log handler deliver its last batch
+        await asyncio.sleep(0)
+        await session.obs._flush()
+        script_log = await session.telstate.get_range('obs_script_log', st=0)
+    # Each message keeps the time at which it was logged
+    tracked = [timestamp for msg, timestamp in script_log if msg.endswith('tracked for 10 seconds')]
+    reached = [timestamp for msg, timestamp in script_log if msg.endswith('target reached')]
+    assert tracked[0] - reached[0] >= 10.0
+
+
+async def test_profile(session, tmp_path):
+    report_file = tmp_path / 'profile.json'
+    args = session.argparser().parse_args(ARGS + [f'--profile={report_file}', '--cprofile'])
+    async with await session.connect(args):
+        await session.track(session.targets.targets[0], duration=10)
+    report = json.loads(report_file.read_text())
+    phases = [phase['name'] for phase in report['phases']]
+    assert phases[0] == 'product_configure'
+    assert 'start ants' in phases
+    assert phases[-2].startswith('track ')
+    assert phases[-1] == 'disconnect'
+    track = report['phases'][-2]
+    assert track['sim_duration'] >= 10.0
+    assert report['updater']['ticks'] > 0
+    assert report['updater']['components']['m062']['update']['count'] > 0
+    assert report['cprofile']
+    assert (tmp_path / 'profile.json.prof').exists()
+
+
+async def test_profile_failed_connect(session, tmp_path, monkeypatch):
+    report_file = tmp_path / 'profile.json'
+    args = session.argparser().parse_args(ARGS + [f'--profile={report_file}', '--cprofile'])
+
+    def broken_logging(*args, **kwargs):
+        raise RuntimeError('Logging is broken')
+
+    monkeypatch.setattr(session, '_configure_logging', broken_logging)
+    with pytest.raises(RuntimeError):
+        await session.connect(args)
+    # The profile still gets written, and cProfile is no longer running
+    assert sys.getprofile() is None
+    assert json.loads(report_file.read_text())['cprofile'] is not None
+    assert (tmp_path / 'profile.json.prof').exists()
+
+
+async def test_fakeredis_telstate(session):
+    pytest.importorskip('fakeredis')
+    args = session.argparser().parse_args(ARGS + ['--telstate=fakeredis', '--trace-telstate'])
+    async with await session.connect(args):
+        assert isinstance(session.telstate.backend, RedisBackend)
+        await session.track(session.targets.targets[0], duration=10)
+        assert await _telstate_get(session, 'obs_activity') == 'track'
+        assert session.telstate_traffic.round_trips > 0
+        assert session.telstate_traffic.bytes_written > 0
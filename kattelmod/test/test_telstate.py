@@ -0,0 +1,131 @@
+import katsdptelstate.aio
+from katsdptelstate.aio.redis import RedisBackend
+import pytest
+
+from kattelmod.telstate import TelstateWriter, add_many, trace_redis, _add_mutable
+from kattelmod.test.test_clock import WarpEventLoopTestCase
+
+
+class TestTelstateWriter(WarpEventLoopTestCase):
+    def setup_method(self):
+        self.telstate = katsdptelstate.aio.TelescopeState()
+        self.writer = TelstateWriter(max_pending=4)
+
+    async def test_single_batch(self):
+        view = self.telstate.view('cb')
+        self.writer.add(self.telstate, ('a', 2.0, 20.0, False))
+        self.writer.add(view, ('b', 1.0, 10.0, False))
+        self.writer.add(self.telstate, ('a', 1.0, 10.0, False))
+        assert self.writer.depth == 3
+        await self.writer.flush()
+        assert self.writer.depth == 0
+        assert self.writer.max_depth == 3
+        assert self.writer.stats.batched_writes == 3
+        assert await self.telstate.get_range('a', st=0) == [(1.0, 10.0), (2.0, 20.0)]
+        assert await self.telstate.get('cb_b') == 1.0
+
+    async def test_max_pending(self):
+        for n in range(10):
+            self.writer.add(self.telstate, ('a', float(n), 10.0 + n, False))
+        assert self.writer.depth == 4
+        await self.writer.flush()
+        # Mutable updates beyond max_pending are dropped
+        assert len(await self.telstate.get_range('a', st=0)) == 4
+        assert self.writer.stats.dropped_writes == 6
+        # Initial updates are not, but batches are capped at max_pending updates
+        for n in range(10):
+            self.writer.add(self.telstate, ('b', float(n), 10.0 + n, False), initial=True)
+        await self.writer.flush()
+        assert len(await self.telstate.get_range('b', st=0)) == 10
+        assert self.writer.stats.batches == 4
+
+    async def test_put(self):
+        for n in range(10):
+            await self.writer.put(self.telstate, ('a', float(n), 10.0 + n, False))
+            assert self.writer.depth <= 4
+        await self.writer.flush()
+        assert self.writer.max_depth == 4
+        assert len(await self.telstate.get_range('a', st=0)) == 10
+
+    async def test_immutable(self):
+        self.writer.add(self.telstate, ('c', 'hello', 0.0, True))
+        await self.writer.flush()
+        assert self.writer.stats.individual_writes == 1
+        assert await self.telstate.key_type('c') == katsdptelstate.KeyType.IMMUTABLE
+
+    async def test_dedupe(self):
+        self.writer.dedupe = True
+        self.writer.keep_alive = 5.0
+        for n in range(10):
+            self.writer.add(self.telstate, ('a', 'track', 10.0 + n, False))
+        self.writer.add(self.telstate, ('a', 'slew', 20.0, False))
+        await self.writer.flush()
+        assert await self.telstate.get_range('a', st=0) == \
+            [('track', 10.0), ('track', 15.0), ('slew', 20.0)]
+        assert self.writer.stats.suppressed_writes == 8
+
+
+    async def test_dedupe_per_telstate(self):
+        self.writer.dedupe = True
+        other = katsdptelstate.aio.TelescopeState()
+        self.writer.add(self.telstate, ('a', 'track', 10.0, False))
+        self.writer.add(other, ('a', 'track', 11.0, False))
+        # Initial updates are always sent
+        self.writer.add(other, ('a', 'track', 12.0, False), initial=True)
+        self.writer.add(other, ('a', 'track', 13.0, False))
+        await self.writer.flush()
+        assert await self.telstate.get_range('a', st=0) == [('track', 10.0)]
+        assert await other.get_range('a', st=0) == [('track', 11.0), ('track', 12.0)]
+        self.writer.forget_sent()
+        self.writer.add(self.telstate, ('a', 'track', 14.0, False))
+        await self.writer.flush()
+        assert await self.telstate.get_range('a', st=0) == [('track', 10.0), ('track', 14.0)]
+
+class TestRedisTraffic(WarpEventLoopTestCase):
+    async def test_pipelined_batch(self):
+        fakeredis = pytest.importorskip('fakeredis.aioredis')
+        backend = RedisBackend(fakeredis.FakeRedis())
+        traffic = trace_redis(backend)
+        telstate = katsdptelstate.aio.TelescopeState(backend)
+        # Set up the connection, which has its own handshake
+        await backend.client.ping()
+        before = traffic.copy()
+        writer = TelstateWriter()
+        for n in range(10):
+            writer.add(telstate, ('a', float(n), 10.0 + n, False))
+        await writer.flush()
+        # The first batch also has to load the Lua script (NOSCRIPT, load, retry)
+        assert (traffic - before).round_trips == 3
+        before = traffic.copy()
+        for n in range(10):
+            writer.add(telstate, ('a', float(n), 20.0 + n, False))
+        await writer.flush()
+        batch = traffic - before
+        # After that, a whole batch goes out in a single pipeline
+        assert batch.round_trips == 1
+        assert batch.bytes_written > 10 * 40
+        assert batch.latency_total > 0.0
+        assert len(await telstate.get_range('a', st=0)) == 20
+        backend.close()
+        await backend.wait_closed()
+
+    async def test_script_registered_once(self):
+        fakeredis = pytest.importorskip('fakeredis.aioredis')
+        backend = RedisBackend(fakeredis.FakeRedis())
+        telstate = katsdptelstate.aio.TelescopeState(backend)
+        await add_many(telstate, [('a', 1.0, 10.0, False)])
+        script = _add_mutable(backend)
+        await add_many(telstate, [('a', 2.0, 20.0, False)])
+        assert _add_mutable(backend) is script
+        backend.close()
+        await backend.wait_closed()
+
+    async def test_immutable_key(self):
+        fakeredis = pytest.importorskip('fakeredis.aioredis')
+        backend = RedisBackend(fakeredis.FakeRedis())
+        telstate = katsdptelstate.aio.TelescopeState(backend)
+        await telstate.add('a', 1.0, immutable=True)
+        with pytest.raises(katsdptelstate.ImmutableKeyError, match="key 'a' to mutable"):
+            await add_many(telstate, [('b', 1.0, 10.0, False), ('a', 2.0, 10.0, False)])
+        backend.close()
+        await backend.wait_closed()
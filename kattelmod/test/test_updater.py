@@ -20,6 +20,17 @@ class DummyComponent(TelstateUpdatingComponent):
         get_clock().advance(self._consume)
 
 
+class PredictingComponent(DummyComponent):
+    def __init__(self, events: List[float]) -> None:
+        super().__init__()
+        self._events = events
+
+    def _next_event(self) -> float:
+        future = [event for event in self._events
+                  if event > (self._updates[-1] if self._updates else 0.0)]
+        return future[0] if future else float('inf')
+
+
 class TestPeriodicUpdater(WarpEventLoopTestCase):
     async def test_periodic(self) -> None:
         comp = DummyComponent()
@@ -87,3 +98,105 @@ class TestPeriodicUpdater(WarpEventLoopTestCase):
         # timestamps.
         assert comp1._updates == expected
         assert comp2._updates == expected
+
+    async def test_component_periods(self) -> None:
+        fast = DummyComponent()
+        slow = DummyComponent()
+        slow._update_period = 3.0
+        async with PeriodicUpdater([fast, slow], period=1.0) as updater:
+            await asyncio.sleep(6.5)
+        assert fast._updates == [1234567890.0 + n for n in range(7)]
+        # Components due in the same slot share the tick timestamp
+        assert slow._updates == [1234567890.0, 1234567893.0, 1234567896.0]
+        assert updater.scheduler.periods == [1.0, 3.0]
+
+    async def test_fast_component(self) -> None:
+        fast = DummyComponent()
+        fast._update_period = 0.5
+        async with PeriodicUpdater([fast], period=2.0):
+            await asyncio.sleep(2.2)
+        assert fast._updates == [1234567890.0, 1234567890.5, 1234567891.0,
+                                 1234567891.5, 1234567892.0]
+
+    async def test_skip_overruns(self) -> None:
+        comp1 = DummyComponent(1.0)
+        comp2 = DummyComponent(1.0)
+        async with PeriodicUpdater([comp1, comp2], period=1.5, overrun='skip') as updater:
+            await asyncio.sleep(6.5)
+        # Deadlines stay on the original grid, dropping the ones that were missed
+        expected = [1234567890.0, 1234567893.0, 1234567896.0]
+        assert comp1._updates == expected
+        assert comp2._updates == expected
+        # Each tick misses one deadline of each component (1.5, 4.5, 7.5)
+        assert updater.stats.skipped_ticks == 3 * 2
+
+    async def test_stats(self) -> None:
+        fast = DummyComponent()
+        fast._name = 'fast'
+        slow = DummyComponent(3.0)
+        slow._name = 'slow'
+        slow._update_period = 4.0
+        async with PeriodicUpdater([fast, slow], period=2.0) as updater:
+            await asyncio.sleep(5)
+        stats = updater.stats
+        # Ticks at 0 (overrun), 3 (catching up on 2) and 4 (overrun)
+        assert fast._updates == [1234567890.0, 1234567893.0, 1234567894.0]
+        assert slow._updates == [1234567890.0, 1234567894.0]
+        assert stats.ticks == 3
+        assert stats.overruns == 2
+        assert stats.skipped_ticks == 0
+        assert stats.tick_latency.max == 3.0
+        assert stats.tick_latency.counts == [1, 0, 0, 0, 2, 0]
+        assert stats.update_durations['fast'].count == 3
+        assert stats.update_durations['slow'].count == 2
+        assert stats.flush_durations['fast'].count == 3
+
+    def test_bad_overrun_policy(self) -> None:
+        with pytest.raises(ValueError):
+            PeriodicUpdater([], overrun='panic')
+
+    async def test_depends(self) -> None:
+        loop = asyncio.get_running_loop()
+        comp = DummyComponent()
+        comp.ready = False
+        calls = []
+
+        def condition():
+            calls.append(comp.ready)
+            return comp.ready
+
+        async with PeriodicUpdater([], period=1.0) as updater:
+            future = loop.create_future()
+            updater.add_condition(condition, future, depends=[(comp, 'ready')])
+            await asyncio.sleep(10)
+            # Only checked once, since the sensor did not change since then
+            assert calls == [False]
+            comp.ready = False
+            await asyncio.sleep(2)
+            assert calls == [False]
+            comp.ready = True
+            await asyncio.sleep(2)
+            assert future.done()
+            assert calls == [False, True]
+        # Watchers are removed together with the condition
+        assert not comp._watchers
+
+    async def test_fast_forward(self) -> None:
+        loop = asyncio.get_running_loop()
+        start = 1234567890.0
+        comp = DummyComponent()
+        comp._update_period = 1.0
+        predictor = PredictingComponent([start + 3.25, start + 17.5])
+        async with PeriodicUpdater([comp, predictor], period=10.0,
+                                   fast_forward=True) as updater:
+            await asyncio.sleep(12)
+            assert predictor._fast_forward
+            # Conditions are checked straight away instead of on the next sample
+            future = loop.create_future()
+            updater.add_condition(lambda: loop.clock.time(), future)
+            assert await future == start + 12.0
+            await asyncio.sleep(10)
+        # Component periods are stretched to the sample period
+        assert comp._updates == [start, start + 10.0, start + 20.0]
+        assert predictor._updates == [start, start + 3.25, start + 10.0,
+                                      start + 17.5, start + 20.0]
@@ -1,30 +1,230 @@
 import logging
 import asyncio
-from typing import Sequence, Set, Tuple, Callable, Any, Optional    # noqa: F401
+import heapq
+import math
+import time
+from typing import (Sequence, Iterable, List, Set, Tuple, Dict,   # noqa: F401
+                    Callable, Any, Optional)
 
 from .component import TelstateUpdatingComponent
 from .clock import get_clock
 
 
 logger = logging.getLogger(__name__)
+# A condition callable and the future that receives its result
+_Check = Tuple[Callable[[], Any], asyncio.Future]
+
+
+class DurationStats:
+    """Summary of a series of durations, with an optional histogram.
+
+    Parameters
+    ----------
+    bounds
+        Upper bounds of histogram bins in seconds, in increasing order (an
+        overflow bin is added for durations beyond the last bound)
+    """
+
+    def __init__(self, bounds: Sequence[float] = ()) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration: float) -> None:
+        """Record a single duration."""
+        n = 0
+        while n < len(self.bounds) and duration > self.bounds[n]:
+            n += 1
+        self.counts[n] += 1
+        self.count += 1
+        self.total += duration
+        self.max = max(self.max, duration)
+
+    @property
+    def mean(self) -> float:
+        return self.total / self.count if self.count else 0.0
+
+    def __repr__(self) -> str:
+        return '<DurationStats count={} mean={:g} max={:g}>'.format(
+            self.count, self.mean, self.max)
+
+
+class UpdaterStats:
+    """Timing statistics of a :class:`PeriodicUpdater`.
+
+    Tick latencies and overruns are measured on the session clock, since that
+    is what the schedule runs on, while the durations of individual component
+    updates and flushes are wall-clock times that reflect their actual cost.
+
+    Attributes
+    ----------
+    ticks : int
+        Number of passes through the update loop
+    tick_latency : :class:`DurationStats`
+        Time taken by each tick, with a histogram in multiples of the period
+    overruns : int
+        Number of ticks that took longer than the updater period
+    skipped_ticks : int
+        Number of component updates dropped by the 'skip' overrun policy
+    update_durations, flush_durations : dict mapping str to :class:`DurationStats`
+        Duration of `_update` and `_flush` calls per component name
+    """
+
+    # Histogram bin edges of tick latency as a fraction of the period
+    LATENCY_BINS = (0.01, 0.1, 0.5, 1.0, 2.0)
+
+    def __init__(self, period: float) -> None:
+        self.ticks = 0
+        self.tick_latency = DurationStats([f * period for f in self.LATENCY_BINS])
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.update_durations = {}   # type: Dict[str, DurationStats]
+        self.flush_durations = {}    # type: Dict[str, DurationStats]
+
+    def __repr__(self) -> str:
+        return '<UpdaterStats ticks={} overruns={} skipped_ticks={} latency={!r}>'.format(
+            self.ticks, self.overruns, self.skipped_ticks, self.tick_latency)
+
+
+class UpdateScheduler:
+    """Schedule that decides which components are due for an update.
+
+    It keeps a heap of the next due time of each component. A component is
+    updated every `_update_period` seconds if it has such an attribute that
+    is not None, otherwise every `default_period` seconds. All components
+    that are due within `tolerance` seconds of a tick share that tick.
+
+    Due times are absolute deadlines anchored at the first update of each
+    component, so that the schedule does not drift with timer jitter or the
+    time spent on updates. If updates fall behind, the `overrun` policy
+    decides what happens to the deadlines that were missed: 'catch-up'
+    still does an update for each of them as soon as possible, while 'skip'
+    drops them and waits for the next deadline in the future.
+
+    Parameters
+    ----------
+    components
+        Components to schedule, referred to by index
+    default_period
+        Update period of components that don't specify their own
+    tolerance
+        Components due this soon after a tick are updated with it, which
+        allows for timer jitter (default is 1% of `default_period`)
+    overrun
+        Policy for missed deadlines, either 'catch-up' or 'skip'
+    min_period
+        Lower limit on the update period of all components
+    """
+
+    OVERRUN_POLICIES = ('catch-up', 'skip')
+
+    def __init__(self, components: Sequence[TelstateUpdatingComponent],
+                 default_period: float, tolerance: float = None,
+                 overrun: str = 'catch-up', min_period: float = 0.0) -> None:
+        if overrun not in self.OVERRUN_POLICIES:
+            raise ValueError('Unknown overrun policy {!r}, expected one of {}'
+                             .format(overrun, self.OVERRUN_POLICIES))
+        self.periods = [max(getattr(component, '_update_period', None) or default_period,
+                            min_period) for component in components]
+        self.tolerance = 0.01 * default_period if tolerance is None else tolerance
+        self.overrun = overrun
+        # Everything is due on the first tick
+        self._heap = [(-math.inf, n) for n in range(len(components))]
+        self._due = [-math.inf] * len(components)
+
+    def pop_due(self, timestamp: float) -> List[int]:
+        """Remove indices of components due at `timestamp` from the schedule."""
+        due = []
+        while self._heap and self._heap[0][0] <= timestamp + self.tolerance:
+            deadline, n = heapq.heappop(self._heap)
+            # The first update anchors the deadlines of the component
+            self._due[n] = deadline if deadline > -math.inf else timestamp
+            due.append(n)
+        return due
+
+    def reschedule(self, indices: Sequence[int], timestamp: float) -> int:
+        """Schedule the next update of components that were popped earlier.
+
+        Parameters
+        ----------
+        indices
+            Components that were updated (as returned by :meth:`pop_due`)
+        timestamp
+            Current time, used to identify deadlines that were missed
+
+        Returns
+        -------
+        skipped
+            Number of updates dropped by the 'skip' overrun policy
+        """
+        skipped = 0
+        for n in indices:
+            period = self.periods[n]
+            deadline = self._due[n] + period
+            if self.overrun == 'skip' and deadline <= timestamp + self.tolerance:
+                missed = math.floor((timestamp + self.tolerance - deadline) / period) + 1
+                deadline += missed * period
+                skipped += missed
+            self._due[n] = deadline
+            heapq.heappush(self._heap, (deadline, n))
+        return skipped
+
+    def next_due(self) -> float:
+        """Time at which the next component is due (infinite if none)."""
+        return self._heap[0][0] if self._heap else math.inf
 
 
 class PeriodicUpdater:
     """Task which periodically updates a group of components.
 
     After each update, it can also check conditions and signal futures if
-    they are true.
+    they are true. Conditions are checked every `period` seconds, while
+    components are updated according to `scheduler` (by default every
+    `period` seconds unless they specify their own `_update_period`). Both
+    run on absolute deadlines, so that neither drifts. Timing statistics are
+    kept in `stats` (see :class:`UpdaterStats`).
+
+    In `fast_forward` mode (meant for dry runs) `period` is a coarse sample
+    period that also applies to all components, so that their sensors still
+    get plausible updates. In between, the updater jumps straight to events
+    predicted by components that have a `_next_event` method (such as a fake
+    antenna reaching its target), updating those components at exactly that
+    time. It also wakes up whenever a condition is added, to check it without
+    waiting for the next sample. The predicting components get their
+    `_fast_forward` attribute set, in case they need to bring their own state
+    up to date when things change between updates.
     """
 
     def __init__(self, components: Sequence[TelstateUpdatingComponent],
-                 period: float = 0.1) -> None:
+                 period: float = 0.1, scheduler: UpdateScheduler = None,
+                 overrun: str = 'catch-up', fast_forward: bool = False) -> None:
         # TODO: the type hint is for TelstateUpdatingComponent, but it could
         # be replaced by a mypy Protocol requiring _update and _flush.
         self.components = components
         self.period = period
+        self.fast_forward = fast_forward
+        self.scheduler = scheduler if scheduler is not None \
+            else UpdateScheduler(components, period, overrun=overrun,
+                                 min_period=period if fast_forward else 0.0)
+        self._predictors = []    # type: List[int]
+        if fast_forward:
+            self._predictors = [n for n, component in enumerate(components)
+                                if hasattr(component, '_next_event')]
+            for n in self._predictors:
+                components[n]._fast_forward = True
+        self._wake = None        # type: Optional[asyncio.Event]
+        self.stats = UpdaterStats(period)
+        self._names = [getattr(component, '_name', '') or str(n)
+                       for n, component in enumerate(components)]
         self._task = None        # type: Optional[asyncio.Task]
         self._active = False
-        self._checks = set()     # type: Set[Tuple[Callable[[], Any], asyncio.Future]]
+        self._checks = set()     # type: Set[_Check]
+        # Sensor watchers of conditions with known dependencies
+        self._subscriptions = {}  # type: Dict[_Check, List[Tuple[Any, str, Callable]]]
+        # Conditions whose dependencies did not change since they were last checked
+        self._clean = set()      # type: Set[_Check]
 
     async def __aenter__(self) -> 'PeriodicUpdater':
         """Enter context."""
@@ -37,40 +237,85 @@ class PeriodicUpdater:
         await self.join()
 
     def _check_and_wake(self) -> None:
-        new_checks = set()       # type: Set[Tuple[Callable[[], Any], asyncio.Future]]
-        for (condition, future) in self._checks:
-            if not future.done():
+        for check in list(self._checks):
+            condition, future = check
+            if future.done():
+                self.remove_condition(condition, future)
+            elif check not in self._clean:
                 result = condition()
                 if result:
                     future.set_result(result)
-                else:
-                    new_checks.add((condition, future))
-        self._checks = new_checks
+                    self.remove_condition(condition, future)
+                elif check in self._subscriptions:
+                    self._clean.add(check)
 
     async def _run(self) -> None:
-        async def update_component(component, timestamp):
+        stats = self.stats
+
+        def update_component(n, timestamp):
+            component = self.components[n]
+            start = time.perf_counter()
             # Force all sensor updates to happen at the same timestamp
             component._update_time = timestamp
             component._update(timestamp)
             component._update_time = 0.0
-            await component._flush()
+            durations = stats.update_durations.setdefault(self._names[n], DurationStats())
+            durations.add(time.perf_counter() - start)
+
+        async def flush_component(n):
+            start = time.perf_counter()
+            await self.components[n]._flush()
+            durations = stats.flush_durations.setdefault(self._names[n], DurationStats())
+            durations.add(time.perf_counter() - start)
 
         clock = get_clock()
+        deadline = None
+        tolerance = self.scheduler.tolerance
+        events = {}      # type: Dict[int, float]
+        self._wake = asyncio.Event()
         try:
             while self._active:
                 timestamp = clock.time()
-                await asyncio.gather(
-                    *(update_component(component, timestamp)
-                      for component in self.components))
+                if deadline is None:
+                    deadline = timestamp
+                due = self.scheduler.pop_due(timestamp)
+                # Predicted events are handled outside the regular schedule
+                updated = due + [n for n, event in events.items()
+                                 if event <= timestamp + tolerance and n not in due]
+                for n in updated:
+                    update_component(n, timestamp)
+                # Components that share a telstate writer only need one flush
+                flushers = {getattr(self.components[n], '_writer', n): n for n in updated}
+                await asyncio.gather(*(flush_component(n) for n in flushers.values()))
                 after_update = clock.time()
+                stats.skipped_ticks += self.scheduler.reschedule(due, after_update)
                 update_time = after_update - timestamp
-                remaining_time = self.period - update_time
-                if remaining_time < 0:
+                stats.ticks += 1
+                stats.tick_latency.add(update_time)
+                if update_time > self.period:
+                    stats.overruns += 1
                     logger.warning("Update task is struggling: updates take "
-                                   "%g seconds but repeat every %g seconds" %
-                                   (update_time, self.period))
+                                   "%g seconds but repeat every %g seconds",
+                                   update_time, self.period)
                 self._check_and_wake()
-                await asyncio.sleep(remaining_time)
+                # Conditions are checked on the next deadline in the future
+                if deadline <= after_update + tolerance:
+                    missed = math.floor((after_update + tolerance - deadline) / self.period)
+                    deadline += (missed + 1) * self.period
+                next_tick = min(deadline, self.scheduler.next_due())
+                if not self.fast_forward:
+                    await asyncio.sleep(next_tick - after_update)
+                    continue
+                events = {n: self.components[n]._next_event() for n in self._predictors}
+                if events:
+                    # Don't spin on events that are (nearly) due already
+                    next_tick = min(next_tick, max(min(events.values()),
+                                                   after_update + tolerance))
+                try:
+                    await asyncio.wait_for(self._wake.wait(), next_tick - after_update)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
         except Exception:
             logger.exception('Exception in updater')
             raise
@@ -90,8 +335,34 @@ class PeriodicUpdater:
             self._task = None
             await task
 
-    def add_condition(self, condition: Callable[[], Any], future: asyncio.Future) -> None:
-        self._checks.add((condition, future))
+    def add_condition(self, condition: Callable[[], Any], future: asyncio.Future,
+                      depends: Iterable[Tuple[TelstateUpdatingComponent, str]] = None) -> None:
+        """Set `future` to the result of `condition` once it is true.
+
+        By default the condition is checked on every tick of the updater.
+        If it only depends on component sensors, list them in `depends` as
+        (component, sensor name) pairs (or give the condition a `depends`
+        attribute, like :class:`~kattelmod.condition.SensorTally`), and it
+        will only be checked again after one of those sensors changed.
+        """
+        check = (condition, future)
+        self._checks.add(check)
+        if depends is None:
+            depends = getattr(condition, 'depends', None)
+        if depends is not None and check not in self._subscriptions:
+            def mark_dirty(component, sensor, value):
+                self._clean.discard(check)
+
+            subscriptions = [(component, sensor, mark_dirty) for component, sensor in depends]
+            for component, sensor, callback in subscriptions:
+                component._watch(sensor, callback)
+            self._subscriptions[check] = subscriptions
+        if self.fast_forward and self._wake is not None:
+            self._wake.set()
 
     def remove_condition(self, condition: Callable[[], Any], future: asyncio.Future) -> None:
-        self._checks.discard((condition, future))
+        check = (condition, future)
+        self._checks.discard(check)
+        self._clean.discard(check)
+        for component, sensor, callback in self._subscriptions.pop(check, []):
+            component._unwatch(sensor, callback)